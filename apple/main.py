@@ -8,7 +8,8 @@ from typing import Optional
 import osxphotos
 from osxphotos import QueryOptions, ExifTool, PhotoInfo
 
-from util.photos import to_mp4, sync_to_s3
+from util.catalog import open_catalog, refresh_catalog
+from util.photos import mp4_path, sync_to_s3, transcode_all
 
 """
 usage:
@@ -21,6 +22,8 @@ setup: python apple/main.py
 
 sync: python apple/main.py --sync
   - copy photos to S3 and ente sync folder
+  - with --catalog, also update the catalog of the keep directory
+    (keep/.catalog.sqlite); the first update reads every file in keep
 """
 
 
@@ -34,6 +37,7 @@ def filename_from_date(pi: PhotoInfo, ext: Optional[str] = None) -> str:
 
 def export_live_photos(output_dir: str, results: list[PhotoInfo]):
     print(f"Found {len(results)} live photos")
+    mov_paths: list[str] = []
     for photo in results:
         base_filename = filename_from_date(photo)
         filename = f"{base_filename}.mov"
@@ -45,9 +49,10 @@ def export_live_photos(output_dir: str, results: list[PhotoInfo]):
             overwrite=True,
             live_photo=False,
         )
-        mp4_filename = to_mp4(mov_path)
-        print(f"wrote Live Photo to {mp4_filename}")
-        os.remove(mov_path)
+        mov_paths.append(mov_path)
+    transcode_all(
+        [(mov_path, mp4_path(mov_path)) for mov_path in mov_paths], remove_input=True
+    )
 
 
 def export_photos_with_metadata(output_dir: str, results: list[PhotoInfo]):
@@ -99,8 +104,8 @@ def export(output_dir: str, days: int):
     print(f"\nreview photos in {output_dir}, then\npython apple/main.py --sync")
 
 
-def sync(root: str, bucket: str):
-    """Sync contents of output_dir to S3."""
+def sync(root: str, bucket: str, catalog: bool = False):
+    """Sync contents of output_dir to S3; update the keep catalog if catalog is set."""
     # move *.mp4 and *.jpg from root/staging to root/keep
     keep_dir = f"{root}/keep"
     staging_dir = f"{root}/staging"
@@ -117,6 +122,8 @@ def sync(root: str, bucket: str):
         os.rename(f"{full_filename}", f"{keep_dir}/{year_filename}")
 
     sync_to_s3(keep_dir, bucket, filenames)
+    if catalog:
+        refresh_catalog(open_catalog(keep_dir), keep_dir)
 
 
 """
@@ -134,6 +141,11 @@ if __name__ == "__main__":
     parser.add_argument("--days", type=int, default=45)
     parser.add_argument("--sync", action="store_true")
     parser.add_argument("--bucket", type=str)
+    parser.add_argument(
+        "--catalog",
+        action="store_true",
+        help="update keep/.catalog.sqlite after sync",
+    )
     args = parser.parse_args()
     _output = args.root or f"/Users/{os.environ.get('USER')}/Pictures"
     _bucket = args.bucket or os.environ.get("S3_PHOTOS_BUCKET")
@@ -142,6 +154,6 @@ if __name__ == "__main__":
             "S3 bucket not set: add --bucket or set S3_PHOTOS_BUCKET in environment"
         )
     if args.sync:
-        sync(_output, _bucket)
+        sync(_output, _bucket, args.catalog)
     else:
         export(f"{_output}/staging", args.days)
@@ -1,33 +1,20 @@
 import argparse
 import glob
-import traceback
 
-from util.photos import rename_exif, to_mp4
+from util.photos import mp4_path, rename_jpg, transcode_all
 
 
 def rename():
-    # copy *.{jpg,jpeg,JPG} files to current directory
-    for idx, fn in enumerate(
-        glob.glob("../all/*.jpg")
-        + glob.glob("../all/*.jpeg")
-        + glob.glob("../all/*.JPG")
-    ):
-        try:
-            rename_exif(fn, "../album", year_prefix=False)
-        except Exception:
-            print(f"error renaming {fn}")
-            traceback.print_exc()
+    # move *.{jpg,jpeg,JPG} files from ../all to ../album with a datetime prefix
+    filenames = rename_jpg("../all", "../album", year_prefix=False)
+    print(f"moved {len(filenames)} files to ../album")
 
 
 def livephotos():
     # *.{mov,mp4} files in current directory to mp4 without audio
-    for idx, fn in enumerate(glob.glob("*.mp4") + glob.glob("*.mov")):
-        try:
-            mp4_filename = to_mp4(fn)
-            print(f"wrote Live Photo to {mp4_filename}")
-        except Exception:
-            print(f"error renaming {fn}")
-            traceback.print_exc()
+    transcode_all(
+        [(fn, mp4_path(fn)) for fn in glob.glob("*.mp4") + glob.glob("*.mov")]
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,51 @@
+import argparse
+
+from dateutil import parser as date_parser
+
+from util.catalog import (
+    open_catalog,
+    photos_between,
+    photos_without_date,
+    photos_without_gps,
+    refresh_catalog,
+)
+
+"""
+usage:
+  python scripts/catalog.py ROOT refresh
+  python scripts/catalog.py ROOT between 2024-07-01 2024-07-31
+  python scripts/catalog.py ROOT no-gps
+  python scripts/catalog.py ROOT no-date
+
+Queries refresh the catalog first unless --no-refresh is set.
+"""
+
+
+def main(root: str, op: str, dates: list, refresh: bool):
+    conn = open_catalog(root)
+    if refresh or op == "refresh":
+        refresh_catalog(conn, root)
+    if op == "between":
+        start, end = [date_parser.parse(d) for d in dates]
+        rows = photos_between(conn, start, end.replace(hour=23, minute=59, second=59))
+    elif op == "no-gps":
+        rows = photos_without_gps(conn)
+    elif op == "no-date":
+        rows = photos_without_date(conn)
+    else:
+        return
+    for row in rows:
+        print(f"{row['path']}\t{row['captured_at']}\t{row['caption'] or ''}")
+    print(f"{len(rows)} files")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("root", type=str)
+    parser.add_argument("op", choices=["refresh", "between", "no-gps", "no-date"])
+    parser.add_argument("dates", nargs="*", help="start and end dates for between")
+    parser.add_argument("--no-refresh", action="store_true")
+    args = parser.parse_args()
+    if args.op == "between" and len(args.dates) != 2:
+        parser.error("between needs a start and end date")
+    main(args.root, args.op, args.dates, not args.no_refresh)
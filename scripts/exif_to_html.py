@@ -1,7 +1,7 @@
 import argparse
 import re
 
-from exif import Image
+from util.metadata import read_metadata
 
 caption_re = [
     re.compile('.*?acdsee:caption="(.*?)".*', re.DOTALL),
@@ -28,10 +28,8 @@ def extract_xmp(fn):
 
 
 def extract_caption(fn):
-    with open(fn, "rb") as image_file:
-        img = Image(image_file)
     try:
-        return img.image_description.strip()
+        return read_metadata(fn).get("description", "").strip()
     except Exception:
         return ""
 
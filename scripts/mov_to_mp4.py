@@ -2,35 +2,21 @@
 Re-encode mov in current directory to mp4, dropping audio.
 """
 
+import argparse
 import glob
-import subprocess
 
+from util.photos import transcode_all
 
-def main():
+
+def main(jobs: int):
     files = sorted(glob.glob("*.mov"))
-    for idx, file_path in enumerate(files):
-        fn = file_path.split("/")[-1]  # IMG_3417.mov
-        out_fn = fn.replace(".mov", ".mp4")
-        # -i input file
-        # -an drop audio track
-        # -vcodec h264 use H.264 encoding
-        # -s target image size
-        # -y overwrite destination file
-        command = ["ffmpeg", "-i", file_path, "-an"] + [
-            out_fn,
-            "-y",
-            "-loglevel",
-            "error",
-        ]
-        print(" ".join(command))
-        process = subprocess.run(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True,
-        )
-        print(process.stdout)
+    transcode_all([(fn, fn.replace(".mov", ".mp4")) for fn in files], jobs=jobs)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--jobs", type=int, help="concurrent ffmpeg jobs (default: cores / 2)"
+    )
+    args = parser.parse_args()
+    main(args.jobs)
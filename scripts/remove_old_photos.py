@@ -1,55 +1,66 @@
 import argparse
+from datetime import datetime
 from typing import Optional
 
-import glob
 import os
-import re
-from exif import Image
 
 from dateutil import parser as date_parser
 
+from util.catalog import (
+    dated_images,
+    images_captured,
+    is_empty,
+    open_catalog,
+    refresh_catalog,
+    refresh_paths,
+    write_entries,
+)
+from util.photos import remove_old
 
-def main(since_str: str, skip_before_str: Optional[str], dry_run: bool):
+
+def remove_from_catalog(
+    since: datetime, skip_before: Optional[datetime], dry_run: bool
+):
+    """Remove photos in and below the current directory using the catalog.
+
+    Candidates come from an indexed query on the capture date; only they are
+    refreshed, so the tree isn't walked (unless the catalog is empty). Each is then
+    dated as remove_old does, so a file the scan would keep is never removed.
+    """
+    conn = open_catalog(".")
+    if is_empty(conn):
+        refresh_catalog(conn, ".")
+    else:
+        candidates = images_captured(conn, since, skip_before)
+        refresh_paths(conn, ".", [row["path"] for row in candidates])
+    rows = images_captured(conn, since, skip_before)
+    remove_old(since, skip_before, dry_run, files=list(dated_images(rows, ".")))
+    if not dry_run:
+        # drop the rows of removed files
+        removed = [row["path"] for row in rows if not os.path.exists(row["path"])]
+        write_entries(conn, ".", [], removed)
+
+
+def main(
+    since_str: str,
+    skip_before_str: Optional[str],
+    dry_run: bool,
+    catalog: bool,
+    threads: int,
+):
     since = date_parser.parse(since_str)
     skip_before = date_parser.parse(skip_before_str) if skip_before_str else None
-    remove = 0
-    for idx, fn in enumerate(glob.glob("*.jpg") + glob.glob("*.jpeg")):
-        # if the filename starts with a date, use that
-        match = re.match(r"(\d\d\d\d-\d\d-\d\d).*", fn)
-        dt = None
-        if match:
-            dt = date_parser.parse(match.group(1))
-        else:
-            with open(fn, "rb") as image_file:
-                img = Image(image_file)
-                try:
-                    # fix weird date format: 2021:08:06 16:07:56
-                    d, t = img.datetime.split(" ")
-                    dt = date_parser.parse(f"{d.replace(':', '-')} {t}")
-                except Exception as exc:
-                    print(f"{fn}\terror parsing: {exc}")
-        if not dt:
-            print(f"{fn}\tskip: can't get date")
-            continue
-        dt_str = dt.strftime("%Y-%m-%d")
-        if dt > since:
-            # print(f"{fn}\tskip too new: {dt} > {since}")
-            continue
-        if skip_before and dt < skip_before:
-            print(f"{fn}\tskip too old: {dt_str} < {skip_before.strftime('%Y-%m-%d')}")
-            continue
-        print(f"{fn}\tremove; {dt_str} <= {since.strftime('%Y-%m-%d')}")
-        remove += 1
-        if not dry_run:
-            os.remove(fn)
-    print(f"remove {remove}")
+    if catalog:
+        remove_from_catalog(since, skip_before, dry_run)
+        return
+    remove_old(since, skip_before, dry_run, threads=threads)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "since",
-        help="remove photos with exif date older than this date (default 2 years ago)",
+        help="remove photos under the current directory with a date older than this",
     )
     parser.add_argument(
         "--skip_before", help="skip files with exif date before this date"
@@ -57,5 +68,13 @@ if __name__ == "__main__":
     parser.add_argument(
         "--dry_run", help="print actions but do not delete", action="store_true"
     )
+    parser.add_argument(
+        "--catalog",
+        help="find photos with the photo catalog instead of reading each file",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--threads", help="threads for reading EXIF", type=int, default=8
+    )
     args = parser.parse_args()
-    main(args.since, args.skip_before, args.dry_run)
+    main(args.since, args.skip_before, args.dry_run, args.catalog, args.threads)
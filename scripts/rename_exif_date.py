@@ -1,28 +1,26 @@
 import argparse
 
-import glob
-import traceback
-
-from util.photos import rename_exif
+from util.photos import rename_journal_filename, rename_jpg, rollback_renames
 
 """
     rename jpg files with prefix from Exif datetime field; keep the numbers at the end
-      IMG_123.jpg -> 20200301_1200_123.jpg
+      IMG_123.jpg -> 2020-03-01_120000_123.jpg
       2021-07-09_12-57-27_471.jpeg -> 2021-07-09_125727_471.jpg
-      dscn0519.jpg -> 20200301_1200_0519.jpg
+      dscn0519.jpg -> 2020-03-01_120000_0519.jpg
     also change jpeg to jpg
 
     python ~/home/photos/scripts/rename_exif_date.py --dest ~/Pictures/amazon-keep --year
+
+    if interrupted, undo the renames with the same --dest and --rollback
 """
 
 
-def main(dest: str, year_prefix: bool, dry_run: bool):
-    for fn in glob.glob("*.jpg") + glob.glob("*.jpeg") + glob.glob("*.JPG"):
-        try:
-            rename_exif(fn, dest, year_prefix, dry_run)
-        except Exception:
-            print(f"error renaming {fn}")
-            traceback.print_exc()
+def main(dest: str, year_prefix: bool, dry_run: bool, rollback: bool):
+    if rollback:
+        rollback_renames(rename_journal_filename("", dest))
+        return
+    filenames = rename_jpg("", dest, year_prefix, dry_run=dry_run)
+    print(f"renamed {len(filenames)} files")
 
 
 if __name__ == "__main__":
@@ -34,5 +32,8 @@ if __name__ == "__main__":
         "--year", help="add year to end of dest path", action="store_true"
     )
     parser.add_argument("--dry_run", help="don't actually rename", action="store_true")
+    parser.add_argument(
+        "--rollback", help="undo an interrupted rename", action="store_true"
+    )
     args = parser.parse_args()
-    main(args.dest, args.year, args.dry_run)
+    main(args.dest, args.year, args.dry_run, args.rollback)
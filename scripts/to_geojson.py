@@ -2,34 +2,24 @@ import argparse
 import json
 from typing import Any
 
-from exif import Image
-
-
-def extract_caption(fn):
-    with open(fn, "rb") as image_file:
-        img = Image(image_file)
-    try:
-        return img.image_description.strip()
-    except Exception:
-        return ""
+from util.metadata import read_metadata
 
 
 def main(filename: str, lat_hemi: str, lng_hemi: str, trailing_comma: bool):
+    metadata = read_metadata(filename)
     lat_multiplier = -1 if lat_hemi == "S" else 1
     lng_multiplier = -1 if lng_hemi == "W" else 1
-    with open(filename, "rb") as f:
-        img = Image(f)
-    (lat_deg, lat_min, lat_sec) = img.gps_latitude
-    (lng_deg, lng_min, lng_sec) = img.gps_longitude
+    (lat_deg, lat_min, lat_sec) = metadata["gps_latitude"]
+    (lng_deg, lng_min, lng_sec) = metadata["gps_longitude"]
     lat = (lat_deg + (lat_min / 60 + lat_sec / 3600)) * lat_multiplier
     lng = (lng_deg + (lng_min / 60 + lng_sec / 3600)) * lng_multiplier
-    altitude = img.gps_altitude if hasattr(img, "gps_altitude") else 0
+    altitude = metadata.get("altitude", 0)
     out: dict[str, Any] = {
         "geometry": {"coordinates": [lng, lat, altitude], "type": "Point"},
         "properties": {"image": filename, "icon": "photo"},
         "type": "Feature",
     }
-    description = extract_caption(filename)
+    description = metadata.get("description", "").strip()
     if description:
         out["properties"]["description"] = description
     extra = "," if trailing_comma else ""
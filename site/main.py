@@ -1,21 +1,41 @@
 import argparse
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+import errno
+import fcntl
+from functools import lru_cache
 import glob
+import gzip
+import io
+from itertools import repeat
+import json
+import math
 import os
 import re
 import shutil
-from typing import List, Dict, Any, Set, Optional
+import struct
+import subprocess
+from typing import List, Dict, Any, Iterable, Set, Optional, Tuple
 
-import boto3
-from bs4 import BeautifulSoup
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 
 from PIL import Image, ImageOps
-from PIL.ExifTags import Base
-from PIL.ExifTags import GPS
 from tqdm import tqdm
 import yaml
 
-from util.photos import extract_caption
+from util.cards import merge_cards_html
+from util.cluster import cluster_points
+from util.metadata import read_metadata_file
+from util.mp4 import faststart, needs_faststart
+from util.s3 import (
+    JOURNAL_FILENAME,
+    Upload,
+    delete_objects,
+    is_changed,
+    list_objects,
+    s3_client,
+    upload_files,
+)
 
 """
 site.yml
@@ -34,8 +54,24 @@ cards
   card.orientation
   card.filename
   card.description
+
+web/.manifest.json
+  filename - file in web/img
+    source - path to original in album
+    fingerprint - size, mtime, img_size, and resize method of source
+    context - EXIF data read from source
 """
 
+MANIFEST_FILENAME = ".manifest.json"
+# recorded in the manifest fingerprint; change to force resizing all photos
+RESIZE_METHOD = "ImageOps.contain"
+# recorded in the manifest fingerprint of mp4s; change to force copying all videos
+MP4_METHOD = "faststart"
+# ioctl to clone a file (reflink) on Linux btrfs and xfs
+FICLONE = 0x40049409
+# zoom level of web/geo/tiles; map.js shows photos at this zoom and above
+GEO_TILE_ZOOM = 8
+
 
 def set_active_page(site: dict, current: str) -> dict:
     for page in site["pages"]:
@@ -44,57 +80,15 @@ def set_active_page(site: dict, current: str) -> dict:
 
 
 def merge_cards(filename: str, cards: List[str]) -> str:
-    """Merge edited html with generated photo cards.
+    """Merge edited html in filename with generated photo cards.
 
-    merge elements with data-source="file"
-      - if id exists in cards but not in html, add where id is greater than previous
-      - if id exists in html but not in cards, remove
-      - if id exists in both, replace with cards version
+    See util.cards.merge_cards_html; returns the content section.
     """
-    attrs = {"data-source": "file"}
-    parsed_cards = [BeautifulSoup(card, "html.parser") for card in cards]
-    # each element in array is a BeautifulSoup object; use find to get the
-    # containing div
-    card_ids: Set[str] = set()
-    cards_by_id: Dict[str, BeautifulSoup] = {}
-    for card in parsed_cards:
-        el = card.find(attrs=attrs)
-        card_id = str(el.get("id"))
-        card_ids.add(card_id)
-        cards_by_id[card_id] = el
     with open(filename, "r") as f:
         html = f.read()
-    soup = BeautifulSoup(html, "html.parser")
-    elements = soup.find_all(attrs=attrs)
-    html_ids = set([el.get("id") for el in elements])
-    to_add: List[str] = sorted(list(card_ids - html_ids))
-    prev_el = None
-    messages: List[str] = []
-    for el in elements:
-        # if id exists in html but not in cards, remove
-        if el.get("id") and el.get("id") not in cards_by_id:
-            messages.append(f"removing {el.get('id')}; not in album")
-            el.decompose()
-            continue
-        # if id exists in cards but not in html, add where id is greater than previous
-        if to_add and to_add[0] < str(el.get("id")):
-            add_after = prev_el if prev_el else el
-            messages.append(f"adding card {to_add[0]} after {add_after.get('id')}")
-            card = cards_by_id.get(to_add.pop(0))
-            add_after.append(card)
-        prev_el = el
-        # if id exists in both, replace with cards version
-        # messages.append(f"updating card {el.get('id')}")
-        # print(".", end="")
-        el.replace_with(cards_by_id.get(el.get("id")))
-
-    for el_id in to_add:
-        messages.append(f"adding card {el_id} after {prev_el.get('id')}")
-        prev_el.append(cards_by_id.get(el_id))
+    content, messages = merge_cards_html(html, cards)
     print("\n".join(messages))
-    # only return the content section
-    content = soup.find(attrs={"data-source": "files"})
-    return str("\n".join([str(el) for el in content.children]))
+    return content
 
 
 def degrees_to_decimal(
@@ -108,62 +102,86 @@ def degrees_to_decimal(
 
 
 def read_exif_resize(filename: str, size: int) -> dict:
-    """Extract EXIF data from filename and write resized image to web/img."""
+    """Extract EXIF data from filename and write resized image to web/img.
+
+    Metadata and pixels are read from one open file.
+    """
     context: Dict[str, Any] = {"error": None}
     # !!! album
     try:
-        img = Image.open(filename)
-        # filename is full path
-        new_filename = filename.replace("/album/", "/web/img/")
-        ImageOps.contain(img, (size, size)).save(new_filename)
-        context["orientation"] = "landscape" if img.width > img.height else "portrait"
-        exif_data = img.getexif()
-        # context["description"] = exif_data.get(Base.ImageDescription, "").strip()
-        context["description"] = extract_caption(filename)
-        gps_info = exif_data.get_ifd(Base.GPSInfo)
-        if gps_info.get(GPS.GPSLatitude) is None:
+        with open(filename, "rb") as f:
+            metadata = read_metadata_file(f)
+            f.seek(0)
+            with Image.open(f) as img:
+                # filename is full path
+                new_filename = filename.replace("/album/", "/web/img/")
+                ImageOps.contain(img, (size, size)).save(new_filename)
+                context["orientation"] = (
+                    "landscape" if img.width > img.height else "portrait"
+                )
+        context["description"] = metadata.get("description", "").strip()
+        if metadata.get("gps_latitude") is None:
             print(f"missing GPS data for {filename}")
             return context
-        degrees, minutes, seconds = gps_info.get(GPS.GPSLatitude)  # (6.0, 45.0, 54.34)
-        ref = gps_info.get(GPS.GPSLatitudeRef)  # 'S'
+        # (6.0, 45.0, 54.34), 'S'
+        degrees, minutes, seconds = metadata["gps_latitude"]
+        ref = metadata["gps_latitude_ref"]
         context["latitude"] = degrees_to_decimal(degrees, minutes, seconds, ref)
-        degrees, minutes, seconds = gps_info.get(GPS.GPSLongitude)  # (37.0, 2.0, 9.34)
-        ref = gps_info.get(GPS.GPSLongitudeRef)  # 'E'
+        # (37.0, 2.0, 9.34), 'E'
+        degrees, minutes, seconds = metadata["gps_longitude"]
+        ref = metadata["gps_longitude_ref"]
         context["longitude"] = degrees_to_decimal(degrees, minutes, seconds, ref)
-        context["altitude"] = round(float(gps_info.get(GPS.GPSAltitude, 0)), 5)
+        context["altitude"] = round(float(metadata.get("altitude", 0)), 5)
     except Exception as e:
         context["error"] = f"{filename}: invalid EXIF data: {e}"
     return context
 
 
+@lru_cache(maxsize=None)
+def get_environment(path: str) -> Environment:
+    """Return the Jinja2 environment for templates under path.
+
+    One environment is shared by all renders for a site; compiled templates are
+    cached in path/.cache/jinja2 so later runs skip compiling them.
+    """
+    cache_dir = f"{path}/.cache/jinja2"
+    os.makedirs(cache_dir, exist_ok=True)
+    return Environment(
+        loader=FileSystemLoader(f"{path}/templates"),
+        bytecode_cache=FileSystemBytecodeCache(cache_dir),
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+
+
 def open_day(path: str, curr_day: str) -> str:
-    env = Environment(loader=FileSystemLoader(f"{path}/templates"))
+    env = get_environment(path)
     return env.get_template("day_open.jinja2").render({"day": curr_day})
 
 
 def close_day(path: str, curr_day: str) -> str:
-    env = Environment(loader=FileSystemLoader(f"{path}/templates"))
+    env = get_environment(path)
     return env.get_template("day_close.jinja2").render({"day": curr_day})
 
 
 def render_new_day(path: str, curr_day: str, prev_day: str) -> str:
-    env = Environment(loader=FileSystemLoader(f"{path}/templates"))
+    env = get_environment(path)
     html = close_day(path, curr_day) if prev_day else ""
     template = env.get_template("day.jinja2")
     return html + open_day(path, curr_day) + template.render({"day": curr_day})
 
 
-def render_active_page(path: str, context: dict, initial: bool):
+def render_active_page(path: str, context: dict, initial: bool) -> bool:
     """Render HTML from list of context objects in page_data.
 
     Render card HTML for each object in page_data. Add day markers between
-    dates if initial run.
+    dates if initial run. Return true if the page changed.
     """
     page_id = context["active_page"]
     out_fn = f"{path}/web/{page_id}.html"
     print(f"Rendering {out_fn}")
 
-    env = Environment(loader=FileSystemLoader(f"{path}/templates"))
+    env = get_environment(path)
     card_template = env.get_template("card.jinja2")
     video_template = env.get_template("card_video.jinja2")
     cards: List[str] = []
@@ -193,25 +211,234 @@ def render_active_page(path: str, context: dict, initial: bool):
     body_html = env.get_template("page_body.jinja2").render(context)
     context["content"] = body_html
     # merge with frame
-    write_file(out_fn, env.get_template("frame.jinja2").render(context))
+    return write_file(out_fn, env.get_template("frame.jinja2").render(context))
+
+
+def read_exif_resize_all(filenames: List[str], size: int, jobs: int) -> List[dict]:
+    """Run read_exif_resize for each filename, in a process pool if jobs > 1.
+
+    Results are returned in the same order as filenames.
+    """
+    if jobs <= 1 or len(filenames) <= 1:
+        return [read_exif_resize(fn, size) for fn in tqdm(filenames, desc="resize")]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(
+            read_exif_resize,
+            filenames,
+            repeat(size),
+            chunksize=max(1, len(filenames) // (jobs * 4)),
+        )
+        return list(tqdm(results, total=len(filenames), desc="resize"))
+
+
+def load_manifest(path: str) -> dict:
+    """Load web/.manifest.json: web/img filename -> source, fingerprint, context."""
+    filename = f"{path}/web/{MANIFEST_FILENAME}"
+    if not os.path.exists(filename):
+        return {}
+    with open(filename, "r") as f:
+        return json.load(f)
+
+
+def write_manifest(path: str, manifest: dict):
+    with open(f"{path}/web/{MANIFEST_FILENAME}", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def source_fingerprint(filename: str, img_size: int) -> dict:
+    """Return the values that determine the web/img copy of filename."""
+    stat = os.stat(filename)
+    return {
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "img_size": img_size,
+        "resize": MP4_METHOD if filename.endswith(".mp4") else RESIZE_METHOD,
+    }
+
+
+def clone_file(src: str, dest: str) -> bool:
+    """Copy src to dest within the filesystem: a reflink, or copy_file_range.
+
+    :return: false if the filesystem can't do either; dest may be partly written
+    """
+    with open(src, "rb") as fsrc, open(dest, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return True
+        except OSError:
+            pass
+        if not hasattr(os, "copy_file_range"):
+            return False
+        remaining = os.fstat(fsrc.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if not copied:
+                    return False
+                remaining -= copied
+        except OSError:
+            return False
+    return True
+
+
+def link_or_copy(src: str, dest: str) -> str:
+    """Hardlink src to dest; on another device, clone or copy it.
+
+    :return: how dest was made: linked, cloned, or copied
+    """
+    tmp_dest = f"{dest}.tmp"
+    if os.path.exists(tmp_dest):
+        os.remove(tmp_dest)
+    try:
+        os.link(src, tmp_dest)
+        os.replace(tmp_dest, dest)
+        return "linked"
+    except OSError as exc:
+        if exc.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+    method = "cloned" if clone_file(src, tmp_dest) else "copied"
+    if method == "copied":
+        shutil.copyfile(src, tmp_dest)
+    shutil.copystat(src, tmp_dest)
+    os.replace(tmp_dest, dest)
+    return method
+
+
+def publish_file(src: str, dest: str) -> str:
+    """Publish a non-jpg file to web/img without copying bytes where possible.
+
+    Skip dest if it has the size and mtime of src. mp4s with moov at the end are
+    rewritten with moov first; other files, and mp4s whose moov can't be parsed,
+    are linked, cloned, or copied.
+
+    :return: how dest was made
+    """
+    if os.path.exists(dest):
+        src_stat, dest_stat = os.stat(src), os.stat(dest)
+        if (src_stat.st_size, src_stat.st_mtime_ns) == (
+            dest_stat.st_size,
+            dest_stat.st_mtime_ns,
+        ):
+            return "unchanged"
+    if src.endswith(".mp4"):
+        try:
+            if needs_faststart(src):
+                moved = faststart(src, dest)
+                shutil.copystat(src, dest)
+                return "faststart" if moved else "copied"
+        except (ValueError, struct.error) as exc:
+            print(f"{src}: can't move moov to the start; publishing unchanged: {exc}")
+    return link_or_copy(src, dest)
+
+
+def is_current(path: str, filename: str, manifest: dict, fingerprint: dict) -> bool:
+    """Return true if web/img/filename was created from the same source and settings."""
+    entry = manifest.get(filename)
+    return (
+        entry is not None
+        and entry["fingerprint"] == fingerprint
+        and os.path.exists(f"{path}/web/img/{filename}")
+    )
+
+
+def prune_manifest(path: str, manifest: dict, album: Set[str]):
+    """Remove web/img files and manifest entries whose source is not in album."""
+    for filename in sorted(set(manifest.keys()) - album):
+        print(f"removing web/img/{filename}; not in album")
+        if os.path.exists(f"{path}/web/img/{filename}"):
+            os.remove(f"{path}/web/img/{filename}")
+        del manifest[filename]
+
+
+def album_index(path: str) -> List[str]:
+    """Return sorted jpg and mp4 filenames in album."""
+    return sorted(
+        os.path.basename(f)
+        for f in glob.glob(f"{path}/album/*.jpg") + glob.glob(f"{path}/album/*.mp4")
+    )
+
+
+def page_range(album: List[str], min_fn: str, max_fn: str) -> tuple[int, int]:
+    """Return start and end indexes of filenames between min_fn and max_fn in album."""
+    return bisect_left(album, min_fn), bisect_right(album, max_fn)
+
+
+def check_page_ranges(album: List[str], pages: List[dict]) -> List[str]:
+    """Report empty pages, pages with overlapping ranges, and files not in any page."""
+    messages: List[str] = []
+    ranges = sorted(
+        page_range(album, page["start"], page["end"]) + (page["id"],) for page in pages
+    )
+    covered = 0
+    prev_id = ""
+    for start, end, page_id in ranges:
+        if start >= end:
+            messages.append(f"{page_id} has no files")
+            continue
+        if start < covered:
+            messages.append(
+                f"{page_id} overlaps {prev_id}: {album[start]} to "
+                f"{album[min(end, covered) - 1]}"
+            )
+        elif start > covered:
+            messages.append(
+                f"{start - covered} files not in any page: {album[covered]} to "
+                f"{album[start - 1]}"
+            )
+        if end > covered:
+            covered, prev_id = end, page_id
+    if covered < len(album):
+        messages.append(
+            f"{len(album) - covered} files not in any page: {album[covered]} to "
+            f"{album[-1]}"
+        )
+    return messages
 
 
-def gather_page_data(path: str, min_fn: str, max_fn: str, img_size: int) -> List[dict]:
-    """Get data for each file between min_fn and max_fn.
+def gather_page_data(
+    path: str,
+    filenames: List[str],
+    img_size: int,
+    jobs: int = 1,
+    manifest: Optional[dict] = None,
+) -> List[dict]:
+    """Get data for each file in filenames.
 
     Return a dictionary for each file, containing id, filename, orientation. If available,
     get description, latitude, longitude, and altitude from EXIF data.
-    Resize and copy files from album to web/img.
+    Resize and copy files from album to web/img; with jobs > 1, decode and resize
+    jpg files in a pool of jobs processes. Skip files where manifest shows the
+    web/img copy is current, and record new copies in manifest.
     """
-    full_filenames = sorted(
-        glob.glob(f"{path}/album/*.jpg") + glob.glob(f"{path}/album/*.mp4")
-    )
-    filenames = [f.split("/")[-1] for f in full_filenames]
-    # get filenames between min_fn and max_fn
-    filenames = [f for f in filenames if min_fn <= f <= max_fn]
+    if manifest is None:
+        manifest = {}
     print(f"{len(filenames)} files: {filenames}")
     messages: List[str] = []
     contexts: List[dict] = []
+    fingerprints = {
+        f: source_fingerprint(f"{path}/album/{f}", img_size) for f in filenames
+    }
+    # only resize jpg files that changed since the last run
+    exif_data = {
+        f: manifest[f]["context"]
+        for f in filenames
+        if f.endswith(".jpg") and is_current(path, f, manifest, fingerprints[f])
+    }
+    jpg_filenames = [f for f in filenames if f.endswith(".jpg") and f not in exif_data]
+    print(f"resizing {len(jpg_filenames)} files; {len(exif_data)} unchanged")
+    for filename, extra in zip(
+        jpg_filenames,
+        read_exif_resize_all(
+            [f"{path}/album/{f}" for f in jpg_filenames], img_size, jobs
+        ),
+    ):
+        exif_data[filename] = extra
+        if not extra.get("error"):
+            manifest[filename] = {
+                "source": f"album/{filename}",
+                "fingerprint": fingerprints[filename],
+                "context": extra,
+            }
     for filename in tqdm(filenames, desc="gather"):
         context = {
             "id": f"p-{filename.split('.')[0]}",  # id can't start with a number
@@ -219,13 +446,20 @@ def gather_page_data(path: str, min_fn: str, max_fn: str, img_size: int) -> List
             "orientation": "landscape",
         }
         if filename.endswith(".jpg"):
-            extra = read_exif_resize(f"{path}/album/{filename}", img_size)
+            extra = exif_data[filename]
             context.update(extra)
             if extra.get("error"):
                 messages.append(extra["error"])
-        else:
-            messages.append(f"copying non-jpg file to {path}/web/img/{filename}")
-            shutil.copy(f"{path}/album/{filename}", f"{path}/web/img/{filename}")
+        elif not is_current(path, filename, manifest, fingerprints[filename]):
+            method = publish_file(
+                f"{path}/album/{filename}", f"{path}/web/img/{filename}"
+            )
+            messages.append(f"{method} non-jpg file to {path}/web/img/{filename}")
+            manifest[filename] = {
+                "source": f"album/{filename}",
+                "fingerprint": fingerprints[filename],
+                "context": {},
+            }
         contexts.append(context)
     print("\n".join(messages))
     return contexts
@@ -237,39 +471,223 @@ def load_site(path: str) -> dict:
     # TODO: validate
 
 
-def write_file(filename: str, html: str):
+def geojson_feature(data: dict, precision: int) -> dict:
+    """Return a GeoJSON point for a photo, with coordinates rounded to precision."""
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [
+                round(data["longitude"], precision),
+                round(data["latitude"], precision),
+                round(data.get("altitude", 0), 1),
+            ],
+        },
+        "properties": {
+            "icon": "photo",
+            "image": f"img/{data['filename']}",
+            "description": data.get("description", ""),
+        },
+    }
+
+
+def tile_xy(longitude: float, latitude: float, zoom: int) -> Tuple[int, int]:
+    """Return x, y of the web mercator tile containing a point."""
+    n = 2**zoom
+    lat = math.radians(max(min(latitude, 85.0511), -85.0511))
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(lat)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def write_feature_collection(filename: str, features: List[str]):
+    """Write serialized features to filename as a FeatureCollection."""
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write('{"type": "FeatureCollection", "features": [\n')
+        f.write(",\n".join(features))
+        f.write("\n]}\n")
+
+
+def write_clusters(path: str, points: List[Tuple[float, float, str]], precision: int):
+    """Write clustered photos for zoom levels below GEO_TILE_ZOOM to geo/clusters.json.
+
+    Each feature has zoom, point_count, and the image of a representative photo.
+    """
+    features: List[str] = []
+    levels = cluster_points(points, max_zoom=GEO_TILE_ZOOM - 1)
+    for zoom, clusters in sorted(levels.items()):
+        for cluster in clusters:
+            feature = {
+                "type": "Feature",
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [
+                        round(cluster["longitude"], precision),
+                        round(cluster["latitude"], precision),
+                    ],
+                },
+                "properties": {
+                    "icon": "photo",
+                    "zoom": zoom,
+                    "point_count": cluster["count"],
+                    "image": cluster["image"],
+                    "description": (
+                        f"{cluster['count']} photos" if cluster["count"] > 1 else ""
+                    ),
+                },
+            }
+            features.append(json.dumps(feature, ensure_ascii=False))
+    write_feature_collection(f"{path}/web/geo/clusters.json", features)
+
+
+def write_geojson(path: str, geo_data: Iterable[dict], precision: int = 5):
+    """Write photo locations to web/photos.json, gzipped web/photos_gz.json, and web/geo.
+
+    Features are written one per line as they are serialized; photos_gz.json
+    is uploaded with Content-Encoding: gzip. In the same pass, group features by
+    map tile and page, and write
+      geo/tiles/{GEO_TILE_ZOOM}/x/y.json - features in each tile
+      geo/pages/page_id.json - features on each page
+      geo/clusters.json - clustered features for zooms below GEO_TILE_ZOOM
+      geo/index.json - tile zoom, tiles, and pages with feature counts and bounds
+    """
+    filename = f"{path}/web/photos.json"
+    print(f"Writing {filename}")
+    tiles: Dict[str, List[str]] = {}
+    pages: Dict[str, List[str]] = {}
+    bounds: Dict[str, List[float]] = {}
+    points: List[Tuple[float, float, str]] = []
+    # mtime=0 so unchanged data produces an identical file
+    with open(filename, "w", encoding="utf-8") as f, io.TextIOWrapper(
+        gzip.GzipFile(f"{path}/web/photos_gz.json", "wb", mtime=0), encoding="utf-8"
+    ) as gz:
+        separator = ""
+        for out in (f, gz):
+            out.write('{"type": "FeatureCollection", "features": [\n')
+        for data in geo_data:
+            feature = geojson_feature(data, precision)
+            line = json.dumps(feature, ensure_ascii=False)
+            f.write(separator + line)
+            gz.write(separator + line)
+            separator = ",\n"
+            lng, lat = feature["geometry"]["coordinates"][:2]
+            points.append((lng, lat, feature["properties"]["image"]))
+            x, y = tile_xy(lng, lat, GEO_TILE_ZOOM)
+            tiles.setdefault(f"{x}/{y}", []).append(line)
+            page_id = data.get("page", "")
+            pages.setdefault(page_id, []).append(line)
+            box = bounds.setdefault(page_id, [lng, lat, lng, lat])
+            box[:] = [
+                min(box[0], lng),
+                min(box[1], lat),
+                max(box[2], lng),
+                max(box[3], lat),
+            ]
+        for out in (f, gz):
+            out.write("\n]}\n")
+    # remove tiles and pages that no longer have photos
+    shutil.rmtree(f"{path}/web/geo", ignore_errors=True)
+    for tile, features in tiles.items():
+        write_feature_collection(
+            f"{path}/web/geo/tiles/{GEO_TILE_ZOOM}/{tile}.json", features
+        )
+    for page_id, features in pages.items():
+        write_feature_collection(f"{path}/web/geo/pages/{page_id}.json", features)
+    write_clusters(path, points, precision)
+    index = {
+        "tile_zoom": GEO_TILE_ZOOM,
+        "tiles": {tile: len(features) for tile, features in sorted(tiles.items())},
+        "pages": {
+            page_id: {"count": len(features), "bounds": bounds[page_id]}
+            for page_id, features in pages.items()
+        },
+    }
+    with open(f"{path}/web/geo/index.json", "w") as f:
+        json.dump(index, f)
+    print(f"Writing {len(tiles)} tiles and {len(pages)} pages to {path}/web/geo")
+
+
+def format_html(html: str) -> str:
+    """Lay out generated HTML the same way on every run.
+
+    Strip trailing whitespace, collapse runs of blank lines, and end with a newline.
+    """
+    lines: List[str] = []
+    for line in html.strip().splitlines():
+        line = line.rstrip()
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def write_file(filename: str, html: str) -> bool:
+    """Write formatted html to filename if it changed; return true if written."""
+    html = format_html(html)
+    if os.path.exists(filename):
+        with open(filename, "r") as f:
+            if f.read() == html:
+                print(f"Unchanged {filename}")
+                return False
     print(f"Writing {filename}")
     with open(f"{filename}", "w") as f:
         f.write(html)
+    return True
 
 
-def render_index(path: str, context: dict):
+def render_index(path: str, context: dict) -> bool:
     page = "index"
-    env = Environment(loader=FileSystemLoader(f"{path}/templates"))
+    env = get_environment(path)
     context["pages"] = set_active_page(context, page)
     context["content"] = env.get_template(f"{page}.jinja2").render(context)
     # merge index content with frame
     html = env.get_template("frame.jinja2").render(context)
-    write_file(f"{path}/web/{page}.html", html)
+    return write_file(f"{path}/web/{page}.html", html)
 
 
-def render_map(path: str, context: dict):
+def render_map(path: str, context: dict) -> bool:
     page = "map"
-    env = Environment(loader=FileSystemLoader(f"{path}/templates"))
+    env = get_environment(path)
     context["pages"] = set_active_page(context, page)
     html = env.get_template(f"{page}.jinja2").render(context)
-    write_file(f"{path}/web/{page}.html", html)
+    return write_file(f"{path}/web/{page}.html", html)
+
+
+def run_prettier(filenames: List[str]):
+    """Reformat filenames with prettier."""
+    if not filenames:
+        return
+    command = ["npx", "prettier", "--write"] + filenames
+    print(" ".join(command))
+    subprocess.run(command)
 
 
-def render_pages(path: str, initial: bool = False, page_name: Optional[str] = None):
-    """Generate HTML for pages."""
-    env = Environment(loader=FileSystemLoader(f"{path}/templates"))
+def render_pages(
+    path: str,
+    initial: bool = False,
+    page_name: Optional[str] = None,
+    jobs: int = 1,
+    prettier: bool = False,
+):
+    """Generate HTML for pages.
+
+    HTML is formatted with format_html as it is written; if prettier is set, also
+    run prettier on the pages that changed.
+    """
     context = load_site(path)
+    changed: List[str] = []
     if initial:
         # TODO: merge? if contents of site changed; or ignore for now
-        render_index(path, context)
-        render_map(path, context)
+        if render_index(path, context):
+            changed.append(f"{path}/web/index.html")
+        if render_map(path, context):
+            changed.append(f"{path}/web/map.html")
     all_data: List[dict] = []
+    manifest = load_manifest(path)
+    album = album_index(path)
+    messages = check_page_ranges(album, context["pages"])
+    if messages:
+        print("\n".join(messages))
     for page in context["pages"]:
         print(f"\nStarting page {page['id']}: {page['start']} to {page['end']}")
         page_id = page["id"]
@@ -278,31 +696,36 @@ def render_pages(path: str, initial: bool = False, page_name: Optional[str] = No
             continue
         # generate page content
         context["pages"] = set_active_page(context, page_id)
+        start, end = page_range(album, page["start"], page["end"])
         page_data = gather_page_data(
-            path, page["start"], page["end"], context["img_size"]
+            path, album[start:end], context["img_size"], jobs, manifest
         )
+        write_manifest(path, manifest)
         # print(f"{len(page_data)} files for {page_id}")
         context["page_data"] = page_data
-        all_data += page_data
-        render_active_page(path, context, initial)
+        all_data += [dict(data, page=page_id) for data in page_data]
+        if render_active_page(path, context, initial):
+            changed.append(f"{path}/web/{page_id}.html")
+    prune_manifest(path, manifest, set(album))
+    write_manifest(path, manifest)
     if not page_name:
         # only render geojson with complete data
-        geo_data = [f for f in all_data if "latitude" in f and "longitude" in f]
-        geo_json = env.get_template("geojson.jinja2").render({"features": geo_data})
-        write_file(f"{path}/web/photos.json", geo_json)
-    os.system(f"npx prettier --write {path}/web/*.html {path}/web/*.json")
+        geo_data = (f for f in all_data if "latitude" in f and "longitude" in f)
+        write_geojson(path, geo_data, context.get("geojson_precision", 5))
+    if prettier:
+        run_prettier(changed)
     # TODO: git
 
 
-def update(path: str, page_name: Optional[str]):
+def update(path: str, page_name: Optional[str], jobs: int = 1, prettier: bool = False):
     """Rewrite HTML and GeoJSON from EXIF data."""
     # TODO: check in current HTML
-    render_pages(path, initial=False, page_name=page_name)
+    render_pages(path, initial=False, page_name=page_name, jobs=jobs, prettier=prettier)
     # TODO: write GeoJSON
     # TODO: check in new HTML
 
 
-def setup(path: str):
+def setup(path: str, jobs: int = 1, prettier: bool = False):
     """Create layout, resize photos, create GeoJSON.
 
     path to .../yyyy-location directory. Must exist under path:
@@ -310,11 +733,14 @@ def setup(path: str):
       album/ - original photos
 
     Create directory layout
+      .cache/jinja2/ - compiled templates
       templates/ - copy of templates from this module
       web/
         img/ - resized photos
         index.html - generated from templates/index.jinja2
         photos.json - photo locations in GeoJSON format
+        photos_gz.json - gzipped photos.json
+        geo/ - photo locations split by map tile and page, with index.json
         style.css
         html file for each key in site.yml pages
         support/ - copy from templates/support in this module
@@ -339,7 +765,7 @@ def setup(path: str):
     shutil.copytree(
         f"{curr_path}/templates/icons", f"{path}/web/icons", dirs_exist_ok=True
     )
-    render_pages(path, initial=True)
+    render_pages(path, initial=True, jobs=jobs, prettier=prettier)
 
     # setup git
     """
@@ -351,11 +777,24 @@ def setup(path: str):
     """
 
 
-def sync_to_s3(path: str, exclude: Optional[str]):
-    """Sync web directory to S3_WEB_BUCKET."""
-    # use boto3 to sync all files in path to S3_WEB_BUCKET/path
-    client = boto3.client("s3")
+def is_gzip(filename: str) -> bool:
+    with open(filename, "rb") as f:
+        return f.read(2) == b"\x1f\x8b"
+
+
+def sync_to_s3(
+    path: str, exclude: Optional[str], threads: int = 10, delete: bool = False
+):
+    """Sync web directory to S3_WEB_BUCKET.
+
+    Upload files that are new or changed since the last sync in a pool of threads.
+    Progress is recorded in path/.s3_journal.json so an interrupted sync resumes.
+    If delete is set, delete keys for files that are no longer in web.
+    """
     bucket = os.environ.get("S3_WEB_BUCKET")
+    if not bucket:
+        raise ValueError("S3 bucket not set: set S3_WEB_BUCKET in environment")
+    client = s3_client(threads)
     bucket_dir = path.split("/")[-1]
     content_type = {
         "html": "text/html",
@@ -367,35 +806,57 @@ def sync_to_s3(path: str, exclude: Optional[str]):
         "png": "image/png",
         "mp4": "video/mp4",
     }
-    content_encoding = {
-        "json": "gzip",
-    }
-    for filename in tqdm(glob.glob(f"{path}/web/**", recursive=True)):
-        # for filename in glob.glob(f"{path}/web/**", recursive=True):
+    remote = list_objects(client, bucket, f"{bucket_dir}/")
+    local_keys: Set[str] = set()
+    uploads: List[Upload] = []
+    for filename in tqdm(glob.glob(f"{path}/web/**", recursive=True), desc="compare"):
         if os.path.isdir(filename):
             continue
+        key = bucket_dir + filename.replace(path, "").replace("web/", "")
+        local_keys.add(key)
         if exclude and re.search(exclude, filename):
             continue
-        key = bucket_dir + filename.replace(path, "").replace("web/", "")
+        if not is_changed(filename, remote.get(key)):
+            continue
         ext = filename.split(".")[-1]
         extra_args = {
             "ACL": "public-read",
             "StorageClass": "STANDARD_IA",
             "ContentType": content_type.get(ext, "application/octet-stream"),
         }
-        if ext in content_encoding:
-            extra_args["ContentEncoding"] = content_encoding[ext]
+        if is_gzip(filename):
+            extra_args["ContentEncoding"] = "gzip"
         print(f"{filename} {ext} -> {key}\t{extra_args}")
-        client.upload_file(filename, bucket, key, ExtraArgs=extra_args)
-
-
-def main(path: str, op: str, page_name: Optional[str], exclude: Optional[str]):
+        uploads.append((filename, key, extra_args))
+    print(f"uploading {len(uploads)} files; {len(local_keys) - len(uploads)} unchanged")
+    failed = upload_files(
+        client, bucket, uploads, threads, journal_filename=f"{path}/{JOURNAL_FILENAME}"
+    )
+    if failed:
+        print(f"{len(failed)} files failed to upload:\n" + "\n".join(failed))
+    orphans = sorted(set(remote) - local_keys)
+    if orphans and delete:
+        delete_objects(client, bucket, orphans)
+    elif orphans:
+        print(f"{len(orphans)} keys not in {path}/web; delete with --delete")
+
+
+def main(
+    path: str,
+    op: str,
+    page_name: Optional[str],
+    exclude: Optional[str],
+    jobs: int,
+    prettier: bool,
+    threads: int,
+    delete: bool,
+):
     if op == "setup":
-        setup(path)
+        setup(path, jobs, prettier)
     elif op == "update":
-        update(path, page_name)
+        update(path, page_name, jobs, prettier)
     elif op == "sync":
-        sync_to_s3(path, exclude)
+        sync_to_s3(path, exclude, threads, delete)
     else:
         print(f"Unknown operation: {op}")
 
@@ -413,5 +874,33 @@ if __name__ == "__main__":
     parser.add_argument(
         "--exclude", type=str, help="exclude files matching this pattern from sync"
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="resize photos in this many processes (setup, update)",
+    )
+    parser.add_argument(
+        "--prettier",
+        action="store_true",
+        help="reformat changed HTML with npx prettier (setup, update)",
+    )
+    parser.add_argument(
+        "--threads", type=int, default=10, help="upload in this many threads (sync)"
+    )
+    parser.add_argument(
+        "--delete",
+        action="store_true",
+        help="delete keys for files no longer in web (sync)",
+    )
     args = parser.parse_args()
-    main(args.path, args.op, args.page, args.exclude)
+    main(
+        args.path,
+        args.op,
+        args.page,
+        args.exclude,
+        args.jobs,
+        args.prettier,
+        args.threads,
+        args.delete,
+    )
@@ -5,6 +5,8 @@ const urlParams = new URLSearchParams(window.location.search);
 const latParam = parseFloat(urlParams.get("lat"));
 const lngParam = parseFloat(urlParams.get("lng"));
 const zoomParam = parseInt(urlParams.get("zoom"));
+// show only photos from one page
+const pageParam = urlParams.get("page");
 // test if lat is NaN
 let initialCenter = [37, -7.669];
 let initialZoom = 5;
@@ -21,8 +23,72 @@ const map = new maptilersdk.Map({
   center: initialCenter,
   zoom: initialZoom,
 });
+// photos_gz.json is served with Content-Encoding: gzip from S3; the local
+// server serves it as-is, so use the uncompressed copy there
+const photosUrl = ["localhost", "127.0.0.1"].includes(window.location.hostname)
+  ? "photos.json"
+  : "photos_gz.json";
+
+// geo/index.json lists tiles and pages written by site/main.py
+let geoIndex = null;
+const loadedTiles = new Set();
+const features = [];
+
+function tileXY(lng, lat, zoom) {
+  const n = 2 ** zoom;
+  const rad = (Math.max(Math.min(lat, 85.0511), -85.0511) * Math.PI) / 180;
+  const x = Math.floor(((lng + 180) / 360) * n);
+  const y = Math.floor(((1 - Math.asinh(Math.tan(rad)) / Math.PI) / 2) * n);
+  return [Math.min(Math.max(x, 0), n - 1), Math.min(Math.max(y, 0), n - 1)];
+}
+
+async function addFeatures(url) {
+  const response = await fetch(url);
+  const data = await response.json();
+  features.push(...data.features);
+  map.getSource("photos").setData({ type: "FeatureCollection", features });
+}
+
+// fetch tiles in view that have photos and are not loaded yet
+async function loadVisibleTiles() {
+  const zoom = geoIndex.tile_zoom;
+  if (map.getZoom() < zoom) return;
+  const bounds = map.getBounds();
+  const [minX, minY] = tileXY(bounds.getWest(), bounds.getNorth(), zoom);
+  const [maxX, maxY] = tileXY(bounds.getEast(), bounds.getSouth(), zoom);
+  const requests = [];
+  for (let x = minX; x <= maxX; x++) {
+    for (let y = minY; y <= maxY; y++) {
+      const tile = `${x}/${y}`;
+      if (geoIndex.tiles[tile] === undefined || loadedTiles.has(tile)) continue;
+      loadedTiles.add(tile);
+      requests.push(addFeatures(`geo/tiles/${zoom}/${tile}.json`));
+    }
+  }
+  await Promise.all(requests);
+}
+
 map.on("load", async function () {
-  map.addSource("photos", { type: "geojson", data: "photos.json" });
+  map.addSource("photos", {
+    type: "geojson",
+    data: { type: "FeatureCollection", features: [] },
+  });
+  try {
+    geoIndex = await (await fetch("geo/index.json")).json();
+  } catch (e) {
+    geoIndex = null;
+  }
+  if (geoIndex && pageParam && geoIndex.pages[pageParam]) {
+    await addFeatures(`geo/pages/${pageParam}.json`);
+    if (isNaN(latParam) || isNaN(lngParam)) {
+      map.fitBounds(geoIndex.pages[pageParam].bounds, { padding: 40 });
+    }
+  } else if (geoIndex) {
+    map.on("moveend", loadVisibleTiles);
+    await loadVisibleTiles();
+  } else {
+    await addFeatures(photosUrl);
+  }
 
   const icons = {
     lodging: await map.loadImage("icons/lodging.png"),
@@ -35,6 +101,35 @@ map.on("load", async function () {
     if (map.hasImage(icon)) map.removeImage(icon);
     map.addImage(icon, icons[icon].data);
   }
+  // show clusters of photos below the tile zoom; geo/clusters.json has
+  // clusters for each zoom level, computed by site/main.py
+  if (geoIndex && !pageParam) {
+    map.addSource("clusters", { type: "geojson", data: "geo/clusters.json" });
+    for (let zoom = 0; zoom < geoIndex.tile_zoom; zoom++) {
+      map.addLayer({
+        id: `clusters-${zoom}`,
+        minzoom: zoom,
+        maxzoom: zoom + 1,
+        type: "symbol",
+        source: "clusters",
+        filter: ["==", "zoom", zoom],
+        layout: {
+          "icon-image": ["get", "icon"],
+          "text-field": [
+            "case",
+            [">", ["get", "point_count"], 1],
+            ["to-string", ["get", "point_count"]],
+            "",
+          ],
+          "text-size": 12,
+          "text-offset": [0, 1.2],
+          "icon-allow-overlap": true,
+        },
+      });
+      map.on("mouseenter", `clusters-${zoom}`, showPopup);
+      map.on("mouseleave", `clusters-${zoom}`, hidePopup);
+    }
+  }
   // show photos at zoom level 8 and above
   map.addLayer({
     id: "photos",
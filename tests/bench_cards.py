@@ -0,0 +1,91 @@
+import argparse
+import time
+from typing import List, Tuple
+
+from util.cards import merge_cards_html
+
+"""
+Benchmark merge_cards_html on a generated page.
+
+The page has --cards cards in day rows of 20, with a day marker and a
+hand-written note in each row. The generated cards drop every 7th card, change
+every 5th caption, and add one new card after every 20th.
+
+python tests/bench_cards.py --cards 2000
+"""
+
+CARD = """<div class="col" id="{id}" data-source="file">
+  <div class="card">
+    <img class="card-img-top landscape" src="img/{id}.jpg" />
+    <div class="card-body">
+      <div class="card-text">
+        {description}
+      </div>
+    </div>
+  </div>
+</div>"""
+DAY = """<div class="row row-cols-1 row-cols-md-2" id="day-{day}">
+  <div class="col">
+    <div class="card">
+      <div class="card-body">
+        <div class="card-text day">
+          start {day}
+        </div>
+      </div>
+    </div>
+  </div>
+  <p class="note">Hand-written note for <b>{day}</b>.</p>
+"""
+
+
+def card_ids(count: int) -> List[str]:
+    return [f"2024{idx // 20:04d}_{idx % 20:02d}0000" for idx in range(count)]
+
+
+def make_page(count: int) -> str:
+    parts = ['<html><body><div id="page-content" data-source="files">']
+    for idx, el_id in enumerate(card_ids(count)):
+        if idx % 20 == 0:
+            if idx:
+                parts.append("</div>")
+            parts.append(DAY.format(day=el_id[:8]))
+        parts.append(CARD.format(id=el_id, description=f"photo {idx}"))
+    parts.append("</div></div></body></html>")
+    return "\n".join(parts)
+
+
+def make_cards(count: int) -> List[str]:
+    cards: List[str] = []
+    for idx, el_id in enumerate(card_ids(count)):
+        if idx % 7 == 3:
+            continue
+        description = f"edited {idx}" if idx % 5 == 0 else f"photo {idx}"
+        cards.append(CARD.format(id=el_id, description=description))
+        if idx % 20 == 19:
+            cards.append(CARD.format(id=f"{el_id}_1", description="new"))
+    return cards
+
+
+def bench(count: int, repeat: int) -> Tuple[float, int]:
+    """Return the best time to merge, and the number of messages."""
+    html = make_page(count)
+    cards = make_cards(count)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _, messages = merge_cards_html(html, cards)
+        best = min(best, time.perf_counter() - start)
+    return best, len(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark merge_cards_html")
+    parser.add_argument("--cards", type=int, default=2000, help="cards in the page")
+    parser.add_argument("--repeat", type=int, default=5, help="times to merge")
+    args = parser.parse_args()
+    best, changes = bench(args.cards, args.repeat)
+    print(f"{args.cards} cards, {changes} added or removed: {best:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import argparse
+from datetime import datetime, timedelta
+import random
+import re
+import time
+from typing import Callable, List
+
+from dateutil import parser as date_parser
+
+from util.dates import (
+    parse_exif_datetime,
+    parse_filename_datetime,
+    parse_filename_datetimes,
+)
+
+"""
+Benchmark util.dates against the strptime and dateutil parsing it replaced.
+
+Generates --count random datetimes, formatted as filenames in the three formats
+util.dates reads and as EXIF values, and checks that every one parses back.
+
+python tests/bench_dates.py --count 100000
+"""
+
+FILENAME_FORMATS = [
+    "%Y-%m-%d_%H-%M-%S.jpg",
+    "IMG_%Y%m%d_%H%M%S.jpg",
+    "2024/%Y-%m-%d_%H%M%S_01636776.jpg",
+]
+
+
+def old_filename_datetime(filename: str) -> datetime:
+    """filename_datetime before util.dates."""
+    match = re.search(r"(\d\d\d\d-\d\d-\d\d_\d\d-\d\d-\d\d)", filename)
+    if match:
+        return datetime.strptime(match.group(1), "%Y-%m-%d_%H-%M-%S")
+    match = re.search(r"(\d\d\d\d\d\d\d\d_\d\d\d\d\d\d)", filename)
+    if match:
+        return date_parser.parse(match.group(1))
+    raise ValueError(f"no date in {filename}")
+
+
+def old_exif_datetime(value: str) -> datetime:
+    """EXIF date parsing before util.dates."""
+    d, t = value.split(" ")
+    return date_parser.parse(f"{d.replace(':', '-')} {t}")
+
+
+def bench(fn: Callable[[], list], repeat: int) -> float:
+    """Return the best time to run fn."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark util.dates")
+    parser.add_argument("--count", type=int, default=100_000, help="dates to parse")
+    parser.add_argument("--repeat", type=int, default=3, help="times to parse")
+    args = parser.parse_args()
+    random.seed(1)
+    base = datetime(2015, 1, 1)
+    dts: List[datetime] = [
+        base + timedelta(seconds=random.randrange(10**9 // 3))
+        for _ in range(args.count)
+    ]
+    names = [
+        dt.strftime(FILENAME_FORMATS[idx % len(FILENAME_FORMATS)])
+        for idx, dt in enumerate(dts)
+    ]
+    # the format the old parser read with strptime
+    amazon = names[:: len(FILENAME_FORMATS)]
+    exif_values = [dt.strftime("%Y:%m:%d %H:%M:%S") for dt in dts]
+    assert parse_filename_datetimes(names) == dts
+    assert [parse_exif_datetime(value) for value in exif_values] == dts
+    assert [old_filename_datetime(name) for name in amazon] == dts[
+        :: len(FILENAME_FORMATS)
+    ]
+    for label, fn, repeat in [
+        (
+            f"filename, Amazon format, {len(amazon)}, old",
+            lambda: [old_filename_datetime(name) for name in amazon],
+            args.repeat,
+        ),
+        (
+            f"filename, Amazon format, {len(amazon)}, new",
+            lambda: [parse_filename_datetime(name) for name in amazon],
+            args.repeat,
+        ),
+        (
+            f"filename, all formats, {len(names)}, new",
+            lambda: parse_filename_datetimes(names),
+            args.repeat,
+        ),
+        (
+            f"EXIF values, {len(exif_values)}, old",
+            lambda: [old_exif_datetime(value) for value in exif_values],
+            1,
+        ),
+        (
+            f"EXIF values, {len(exif_values)}, new",
+            lambda: [parse_exif_datetime(value) for value in exif_values],
+            args.repeat,
+        ),
+    ]:
+        print(f"{label}: {bench(fn, repeat):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
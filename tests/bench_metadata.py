@@ -0,0 +1,89 @@
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable, List
+
+from exif import Image as ExifImage
+import piexif
+from PIL import Image
+
+from util.metadata import read_metadata
+
+"""
+Benchmark read_metadata against the exif library it replaced.
+
+Writes --files jpgs of --size pixels with EXIF dates, caption, and GPS, then
+reads the date, caption, and GPS from each with both readers.
+
+python tests/bench_metadata.py --files 40 --size 2000x1500
+"""
+
+
+def make_files(directory: str, count: int, size: str) -> List[str]:
+    width, height = (int(value) for value in size.split("x"))
+    exif = piexif.dump(
+        {
+            "0th": {
+                piexif.ImageIFD.ImageDescription: b"summit",
+                piexif.ImageIFD.DateTime: "2021:08:06 16:07:56",
+            },
+            "GPS": {
+                piexif.GPSIFD.GPSLatitudeRef: "S",
+                piexif.GPSIFD.GPSLatitude: ((6, 1), (45, 1), (5434, 100)),
+                piexif.GPSIFD.GPSLongitudeRef: "E",
+                piexif.GPSIFD.GPSLongitude: ((37, 1), (2, 1), (934, 100)),
+            },
+        }
+    )
+    # noise, so the image data is about the size of a photo
+    img = Image.effect_noise((width, height), 64).convert("RGB")
+    filenames: List[str] = []
+    for idx in range(count):
+        filename = os.path.join(directory, f"{idx:04d}.jpg")
+        img.save(filename, exif=exif)
+        filenames.append(filename)
+    return filenames
+
+
+def read_exif_library(filename: str) -> tuple:
+    with open(filename, "rb") as f:
+        img = ExifImage(f)
+        return img.datetime, img.image_description, img.gps_latitude
+
+
+def read_util_metadata(filename: str) -> tuple:
+    metadata = read_metadata(filename)
+    return metadata["datetime"], metadata["description"], metadata["gps_latitude"]
+
+
+def bench(filenames: List[str], read: Callable[[str], tuple], repeat: int) -> float:
+    """Return the best time per file, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for filename in filenames:
+            read(filename)
+        best = min(best, time.perf_counter() - start)
+    return best / len(filenames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark read_metadata")
+    parser.add_argument("--files", type=int, default=40, help="jpgs to read")
+    parser.add_argument("--size", default="2000x1500", help="jpg size, WxH")
+    parser.add_argument("--repeat", type=int, default=5, help="times to read")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        filenames = make_files(directory, args.files, args.size)
+        assert read_exif_library(filenames[0]) == read_util_metadata(filenames[0])
+        for name, read in [
+            ("exif", read_exif_library),
+            ("read_metadata", read_util_metadata),
+        ]:
+            per_file = bench(filenames, read, args.repeat)
+            print(f"{name}: {per_file * 1e6:.0f}us per file")
+
+
+if __name__ == "__main__":
+    main()
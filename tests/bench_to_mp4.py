@@ -0,0 +1,102 @@
+import argparse
+import contextlib
+import io
+import os
+import subprocess
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from util.mp4 import read_mp4_info
+from util.photos import to_mp4
+
+"""
+Benchmark to_mp4 copying H.264 video against re-encoding it, as it did before.
+
+Writes --clips testsrc H.264 .mov clips with AAC audio using ffmpeg, converts
+each with both, and checks that every output decodes and keeps the duration and
+creation time. Needs ffmpeg on the path.
+
+python tests/bench_to_mp4.py --clips 6 --size 1920x1440 --seconds 3
+"""
+
+
+def make_clips(directory: str, count: int, size: str, seconds: int) -> List[str]:
+    filenames: List[str] = []
+    for idx in range(count):
+        filename = os.path.join(directory, f"{idx:02d}.mov")
+        command = [
+            "ffmpeg",
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc=size={size}:rate=30",
+            "-f",
+            "lavfi",
+            "-i",
+            "sine",
+            "-t",
+            str(seconds),
+            "-c:v",
+            "libx264",
+            "-pix_fmt",
+            "yuv420p",
+            "-c:a",
+            "aac",
+            "-metadata",
+            f"creation_time=2024-07-20T09:33:{idx:02d}Z",
+            filename,
+            "-y",
+            "-loglevel",
+            "error",
+        ]
+        subprocess.run(command, check=True)
+        filenames.append(filename)
+    return filenames
+
+
+def convert(
+    filenames: List[str], directory: str, info: Optional[Dict[str, Any]]
+) -> List[str]:
+    """Convert filenames into directory; info={} makes to_mp4 re-encode."""
+    os.makedirs(directory, exist_ok=True)
+    outputs: List[str] = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for filename in filenames:
+            output = os.path.join(directory, os.path.basename(filename)[:-4] + ".mp4")
+            to_mp4(filename, output_path=output, threads=1, info=info)
+            outputs.append(output)
+    return outputs
+
+
+def check(filename: str, output: str):
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-i", output, "-f", "null", "-"], check=True
+    )
+    before, after = read_mp4_info(filename), read_mp4_info(output)
+    assert after["video_codec"] == "avc1", output
+    assert after["creation_time"] == before["creation_time"], output
+    assert abs(after["duration"] - before["duration"]) < 0.1, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark to_mp4")
+    parser.add_argument("--clips", type=int, default=6, help="clips to convert")
+    parser.add_argument("--size", default="1920x1440", help="clip size, WxH")
+    parser.add_argument("--seconds", type=int, default=3, help="clip length")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        filenames = make_clips(directory, args.clips, args.size, args.seconds)
+        for name, subdir, info in [
+            ("re-encode (before)", "reencode", {}),
+            ("stream copy", "copy", None),
+        ]:
+            start = time.perf_counter()
+            outputs = convert(filenames, os.path.join(directory, subdir), info)
+            print(f"{name}: {time.perf_counter() - start:.2f}s")
+            for filename, output in zip(filenames, outputs):
+                check(filename, output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import json
+import os
+
+import pytest
+
+from util.cards import card_id, merge_cards_html
+
+"""
+Golden-file tests for util.cards.
+
+Each directory in golden/cards has
+  page.html - edited page
+  cards.json - generated cards
+  expected.html - expected content section
+  messages.txt - expected messages, one per line
+"""
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), "golden", "cards")
+CASES = sorted(os.listdir(GOLDEN_DIR))
+
+
+def read_file(case: str, filename: str) -> str:
+    with open(os.path.join(GOLDEN_DIR, case, filename), "r") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_merge_cards_html(case: str):
+    html = read_file(case, "page.html")
+    cards = json.loads(read_file(case, "cards.json"))
+    content, messages = merge_cards_html(html, cards)
+    assert content + "\n" == read_file(case, "expected.html")
+    assert messages == read_file(case, "messages.txt").splitlines()
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_merge_is_stable(case: str):
+    """Merging the same cards into the merged page changes nothing."""
+    html = read_file(case, "page.html")
+    cards = json.loads(read_file(case, "cards.json"))
+    content, _ = merge_cards_html(html, cards)
+    page = f'<div data-source="files">{content}</div>'
+    assert merge_cards_html(page, cards) == (content, [])
+
+
+def test_no_content_element():
+    with pytest.raises(ValueError):
+        merge_cards_html('<div id="a" data-source="file"></div>', [])
+
+
+def test_card_without_id():
+    with pytest.raises(ValueError):
+        card_id('<div class="col">no card</div>')
@@ -0,0 +1,86 @@
+from datetime import datetime
+import os
+
+import piexif
+from PIL import Image
+
+from util.catalog import (
+    dated_images,
+    images_captured,
+    open_catalog,
+    refresh_catalog,
+    refresh_paths,
+)
+
+"""
+Tests for util.catalog on a directory of small jpgs.
+"""
+
+
+def write_jpg(filename: str, value: str):
+    exif = piexif.dump({"0th": {piexif.ImageIFD.DateTime: value}})
+    Image.new("RGB", (8, 8)).save(filename, exif=exif)
+
+
+def make_catalog(root: str):
+    os.makedirs(f"{root}/sub")
+    write_jpg(f"{root}/a.jpg", "2019:01:01 10:00:00")
+    write_jpg(f"{root}/sub/b.jpg", "2020:06:01 10:00:00")
+    # the filename date is newer than EXIF
+    write_jpg(f"{root}/2024-01-01_120000_c.jpg", "2019:01:01 11:00:00")
+    write_jpg(f"{root}/d.jpg", "2023:06:01 10:00:00")
+    conn = open_catalog(root)
+    refresh_catalog(conn, root)
+    return conn
+
+
+def paths(rows) -> list:
+    return [row["path"] for row in rows]
+
+
+def test_images_captured(tmp_path):
+    conn = make_catalog(str(tmp_path))
+    since = datetime(2021, 1, 1)
+    assert paths(images_captured(conn, since)) == [
+        "a.jpg",
+        "2024-01-01_120000_c.jpg",
+        "sub/b.jpg",
+    ]
+    assert paths(images_captured(conn, since, datetime(2020, 1, 1))) == ["sub/b.jpg"]
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM photos WHERE media_type = 'image' "
+        "AND captured_at BETWEEN ? AND ?",
+        ("", "2021"),
+    ).fetchall()
+    assert "photos_captured_at" in str([tuple(row) for row in plan])
+
+
+def test_dated_images_prefers_filename(tmp_path):
+    root = str(tmp_path)
+    conn = make_catalog(root)
+    dates = {
+        os.path.relpath(path, root): dt
+        for path, _, dt in dated_images(
+            images_captured(conn, datetime(2021, 1, 1)), root
+        )
+    }
+    assert dates == {
+        "a.jpg": datetime(2019, 1, 1, 10),
+        "sub/b.jpg": datetime(2020, 6, 1, 10),
+        "2024-01-01_120000_c.jpg": datetime(2024, 1, 1, 12),
+    }
+
+
+def test_refresh_paths(tmp_path):
+    root = str(tmp_path)
+    conn = make_catalog(root)
+    os.remove(f"{root}/a.jpg")
+    write_jpg(f"{root}/sub/b.jpg", "2022:02:02 10:00:00")
+    # not in paths, so not seen
+    write_jpg(f"{root}/e.jpg", "2018:01:01 10:00:00")
+    assert refresh_paths(conn, root, ["a.jpg", "sub/b.jpg", "d.jpg"]) == (1, 1)
+    assert paths(images_captured(conn, datetime(2030, 1, 1))) == [
+        "2024-01-01_120000_c.jpg",
+        "sub/b.jpg",
+        "d.jpg",
+    ]
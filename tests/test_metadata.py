@@ -0,0 +1,130 @@
+import io
+from typing import Any, Callable, Dict
+
+import exifread
+import piexif
+from PIL import Image, TiffImagePlugin
+import pytest
+
+from util.metadata import read_metadata_file
+
+"""
+Tests for util.metadata: read JPEGs written with piexif (big-endian) and Pillow
+(little-endian), and compare with exifread.
+"""
+
+DATETIME = "2021:08:06 16:07:56"
+DATETIME_ORIGINAL = "2021:08:06 16:07:55"
+DESCRIPTION = "Café ☕ at the summit"
+LATITUDE = ((6, 1), (45, 1), (5434, 100))
+LONGITUDE = ((37, 1), (2, 1), (934, 100))
+# below sea level
+ALTITUDE = (125, 10)
+
+
+def piexif_jpeg() -> bytes:
+    exif = {
+        "0th": {
+            piexif.ImageIFD.ImageDescription: DESCRIPTION.encode("utf-8"),
+            piexif.ImageIFD.Orientation: 6,
+            piexif.ImageIFD.DateTime: DATETIME,
+        },
+        "Exif": {piexif.ExifIFD.DateTimeOriginal: DATETIME_ORIGINAL},
+        "GPS": {
+            piexif.GPSIFD.GPSLatitudeRef: "S",
+            piexif.GPSIFD.GPSLatitude: LATITUDE,
+            piexif.GPSIFD.GPSLongitudeRef: "E",
+            piexif.GPSIFD.GPSLongitude: LONGITUDE,
+            piexif.GPSIFD.GPSAltitudeRef: 1,
+            piexif.GPSIFD.GPSAltitude: ALTITUDE,
+        },
+    }
+    out = io.BytesIO()
+    Image.new("RGB", (40, 30)).save(out, "jpeg", exif=piexif.dump(exif))
+    assert out.getvalue()[30:32] == b"MM"
+    return out.getvalue()
+
+
+def pillow_jpeg() -> bytes:
+    def rationals(value):
+        return tuple(TiffImagePlugin.IFDRational(n, d) for n, d in value)
+
+    exif = Image.Exif()
+    exif.endian = "<"
+    exif[0x010E] = DESCRIPTION.encode("utf-8")
+    exif[0x0112] = 6
+    exif[0x0132] = DATETIME
+    exif.get_ifd(0x8769)[0x9003] = DATETIME_ORIGINAL
+    gps = exif.get_ifd(0x8825)
+    gps[1], gps[2] = "S", rationals(LATITUDE)
+    gps[3], gps[4] = "E", rationals(LONGITUDE)
+    gps[5], gps[6] = b"\x01", TiffImagePlugin.IFDRational(*ALTITUDE)
+    out = io.BytesIO()
+    Image.new("RGB", (40, 30)).save(out, "jpeg", exif=exif)
+    assert out.getvalue()[30:32] == b"II"
+    return out.getvalue()
+
+
+def exifread_metadata(data: bytes) -> Dict[str, Any]:
+    """Return the values read_metadata reads, as read by exifread."""
+    tags = exifread.process_file(io.BytesIO(data), details=False)
+
+    def dms(name: str) -> tuple:
+        return tuple(float(value) for value in tags[name].values)
+
+    lat, lng = dms("GPS GPSLatitude"), dms("GPS GPSLongitude")
+    lat_ref = tags["GPS GPSLatitudeRef"].printable
+    lng_ref = tags["GPS GPSLongitudeRef"].printable
+    altitude = float(tags["GPS GPSAltitude"].values[0])
+    return {
+        "datetime": tags["Image DateTime"].printable,
+        "datetime_original": tags["EXIF DateTimeOriginal"].printable,
+        "description": tags["Image ImageDescription"].printable,
+        "orientation": tags["Image Orientation"].values[0],
+        "gps_latitude": lat,
+        "gps_latitude_ref": lat_ref,
+        "gps_longitude": lng,
+        "gps_longitude_ref": lng_ref,
+        "latitude": (lat[0] + lat[1] / 60 + lat[2] / 3600)
+        * (-1 if lat_ref == "S" else 1),
+        "longitude": (lng[0] + lng[1] / 60 + lng[2] / 3600)
+        * (-1 if lng_ref == "W" else 1),
+        "altitude": -altitude if tags["GPS GPSAltitudeRef"].values[0] else altitude,
+    }
+
+
+@pytest.mark.parametrize("make_jpeg", [piexif_jpeg, pillow_jpeg])
+def test_read_metadata(make_jpeg: Callable[[], bytes]):
+    data = make_jpeg()
+    metadata = read_metadata_file(io.BytesIO(data))
+    assert metadata["datetime"] == DATETIME
+    assert metadata["datetime_original"] == DATETIME_ORIGINAL
+    assert metadata["description"] == DESCRIPTION
+    assert (metadata["width"], metadata["height"]) == (40, 30)
+    assert metadata["latitude"] == pytest.approx(-6.765094, abs=1e-6)
+    assert metadata["longitude"] == pytest.approx(37.035928, abs=1e-6)
+    assert metadata["altitude"] == -12.5
+    for key, value in exifread_metadata(data).items():
+        if isinstance(value, str):
+            assert metadata[key] == value, key
+        else:
+            assert metadata[key] == pytest.approx(value), key
+
+
+def test_no_exif():
+    out = io.BytesIO()
+    Image.new("RGB", (40, 30)).save(out, "jpeg")
+    out.seek(0)
+    assert read_metadata_file(out) == {"width": 40, "height": 30}
+
+
+def test_not_jpeg():
+    with pytest.raises(ValueError):
+        read_metadata_file(io.BytesIO(b"\x89PNG\r\n\x1a\n"))
+
+
+@pytest.mark.parametrize("length", [2, 20, 100, 200])
+def test_truncated(length: int):
+    """A file cut off in the header returns what was read, without raising."""
+    metadata = read_metadata_file(io.BytesIO(piexif_jpeg()[:length]))
+    assert "width" not in metadata
@@ -0,0 +1,181 @@
+from datetime import datetime
+import importlib.util
+import io
+import os
+import random
+import struct
+
+import pytest
+
+from util.mp4 import (
+    faststart,
+    iter_boxes,
+    mp4_creation_time,
+    needs_faststart,
+    read_mp4_info,
+    read_mp4_info_file,
+)
+
+"""
+Tests for util.mp4 on the files in fixtures/mp4, made with ffmpeg:
+
+  ffmpeg -f lavfi -i testsrc=size=32x24:rate=4 -t 0.5 -c:v libx264 \\
+    -pix_fmt yuv420p -metadata creation_time=2021-08-06T16:07:56Z moov_last.mp4
+  ffmpeg -i moov_last.mp4 -c copy -movflags +faststart \\
+    -metadata creation_time=2021-08-06T16:07:56Z faststart.mp4
+  ffmpeg -i moov_last.mp4 -c copy -map_metadata -1 -movflags use_metadata_tags \\
+    -metadata com.apple.quicktime.creationdate=2023-05-06T07:08:09-0700 \\
+    creationdate.mov
+
+The expected values are what ffmpeg -i prints for each file.
+"""
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "mp4")
+VIDEO = {"duration": 0.5, "width": 32, "height": 24, "video_codec": "avc1"}
+CREATION_TIME = datetime(2021, 8, 6, 16, 7, 56)
+CASES = {
+    "moov_last.mp4": (dict(VIDEO, creation_time=CREATION_TIME), True),
+    "faststart.mp4": (dict(VIDEO, creation_time=CREATION_TIME), False),
+    "creationdate.mov": (
+        dict(VIDEO, creationdate="2023-05-06T07:08:09-0700"),
+        True,
+    ),
+}
+
+
+def fixture(name: str) -> str:
+    return os.path.join(FIXTURE_DIR, name)
+
+
+def read_fixture(name: str) -> bytes:
+    with open(fixture(name), "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_read_mp4_info(name: str):
+    info, moov_last = CASES[name]
+    assert read_mp4_info(fixture(name)) == info
+    assert needs_faststart(fixture(name)) == moov_last
+
+
+def test_mp4_creation_time():
+    assert mp4_creation_time(read_mp4_info(fixture("moov_last.mp4"))) == CREATION_TIME
+    # creationdate converted to UTC
+    assert mp4_creation_time(read_mp4_info(fixture("creationdate.mov"))) == datetime(
+        2023, 5, 6, 14, 8, 9
+    )
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_truncated(name: str):
+    """Every prefix of a file reads without raising."""
+    data = read_fixture(name)
+    for length in range(len(data)):
+        info = read_mp4_info_file(io.BytesIO(data[:length]))
+        assert set(info) <= set(CASES[name][0])
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        b"\x00" * 7,
+        random.Random(0).randbytes(4096),
+        # 64 bit size cut off after the 8 byte header
+        struct.pack(">L4s4s", 12, b"ftyp", b"isom") + struct.pack(">L4s", 1, b"mdat"),
+        struct.pack(">L4s4s", 12, b"ftyp", b"isom")
+        + struct.pack(">L4s", 1, b"mdat")
+        + b"abc",
+        # sizes smaller than the header
+        struct.pack(">L4s", 4, b"moov") * 3,
+        struct.pack(">L4sQ", 1, b"moov", 8),
+        # moov with a child box larger than moov
+        struct.pack(">L4sL4s", 16, b"moov", 1000, b"mvhd"),
+    ],
+)
+def test_garbage(data: bytes):
+    assert read_mp4_info_file(io.BytesIO(data)) == {}
+
+
+def test_iter_boxes_largesize():
+    data = (
+        struct.pack(">L4sQ", 1, b"mdat", 20) + b"abcd" + struct.pack(">L4s", 8, b"moov")
+    )
+    assert list(iter_boxes(io.BytesIO(data), 0, len(data))) == [
+        (b"mdat", 16, 20),
+        (b"moov", 28, 28),
+    ]
+    # cut off in the 64 bit size
+    assert list(iter_boxes(io.BytesIO(data[:12]), 0, 12)) == []
+
+
+def box(box_type: bytes, payload: bytes, largesize: bool = False) -> bytes:
+    if largesize:
+        return struct.pack(">L4sQ", 1, box_type, len(payload) + 16) + payload
+    return struct.pack(">L4s", len(payload) + 8, box_type) + payload
+
+
+def offsets_moov(offsets: list) -> bytes:
+    """Return a moov with one track with the offsets in stco, and one in co64."""
+    count = struct.pack(">LL", 0, len(offsets))
+    stco = box(b"stco", count + struct.pack(f">{len(offsets)}L", *offsets))
+    co64 = box(b"co64", count + struct.pack(f">{len(offsets)}Q", *offsets))
+    return box(
+        b"moov",
+        b"".join(
+            box(b"trak", box(b"mdia", box(b"minf", box(b"stbl", table))))
+            for table in [stco, co64]
+        ),
+    )
+
+
+@pytest.mark.parametrize("largesize", [False, True])
+def test_faststart(tmp_path, largesize: bool):
+    ftyp = box(b"ftyp", b"isom\x00\x00\x00\x00")
+    mdat = box(b"mdat", bytes(range(256)) * 4, largesize)
+    media_start = len(ftyp) + len(mdat) - 1024
+    offsets = [media_start, media_start + 100, media_start + 1000]
+    moov = offsets_moov(offsets)
+    src, dest = str(tmp_path / "src.mp4"), str(tmp_path / "dest.mp4")
+    with open(src, "wb") as f:
+        f.write(ftyp + mdat + moov)
+    assert needs_faststart(src)
+    assert faststart(src, dest)
+    with open(dest, "rb") as f:
+        data = f.read()
+    shifted = [offset + len(moov) for offset in offsets]
+    assert data == ftyp + offsets_moov(shifted) + mdat
+    for old, new in zip(offsets, shifted):
+        assert data[new] == (ftyp + mdat)[old]
+    assert not needs_faststart(dest)
+    assert not os.path.exists(f"{dest}.tmp")
+
+
+def test_faststart_fixture(tmp_path):
+    dest = str(tmp_path / "dest.mp4")
+    assert faststart(fixture("moov_last.mp4"), dest)
+    assert not needs_faststart(dest)
+    assert read_mp4_info(dest) == read_mp4_info(fixture("moov_last.mp4"))
+    assert os.path.getsize(dest) == os.path.getsize(fixture("moov_last.mp4"))
+
+
+@pytest.fixture
+def site_main():
+    """site/main.py; the site directory isn't importable as a package."""
+    filename = os.path.join(os.path.dirname(__file__), "..", "site", "main.py")
+    spec = importlib.util.spec_from_file_location("site_main", filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_publish_file_truncated(tmp_path, site_main):
+    src, dest = str(tmp_path / "src.mp4"), str(tmp_path / "dest.mp4")
+    # mdat with a 64 bit size cut off after 3 bytes
+    data = box(b"ftyp", b"isom") + struct.pack(">L4s", 1, b"mdat") + b"abc"
+    with open(src, "wb") as f:
+        f.write(data)
+    assert site_main.publish_file(src, dest) in ("linked", "cloned", "copied")
+    with open(dest, "rb") as f:
+        assert f.read() == data
@@ -0,0 +1,64 @@
+import os
+
+import piexif
+from PIL import Image
+import pytest
+
+from util.photos import rename_exif, resolve_renames
+
+"""
+Tests for renaming in util.photos.
+"""
+
+
+def write(filename: str, data: bytes) -> str:
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, "wb") as f:
+        f.write(data)
+    return filename
+
+
+def write_jpg(filename: str, value: str) -> str:
+    exif = piexif.dump({"0th": {piexif.ImageIFD.DateTime: value}} if value else {})
+    Image.new("RGB", (8, 8)).save(filename, exif=exif)
+    return filename
+
+
+def test_resolve_renames(tmp_path):
+    a = write(f"{tmp_path}/a/x.jpg", b"x")
+    b = write(f"{tmp_path}/b/x.jpg", b"x")
+    c = write(f"{tmp_path}/c/x.jpg", b"c")
+    existing = write(f"{tmp_path}/dest/y.jpg", b"y")
+    d = write(f"{tmp_path}/d/y.jpg", b"d")
+    e = write(f"{tmp_path}/e/y.jpg", b"y")
+    target = f"{tmp_path}/dest/x.jpg"
+    renames, duplicates = resolve_renames(
+        [(a, target), (b, target), (c, target), (d, existing), (e, existing)]
+    )
+    assert renames == [
+        (a, target),
+        (c, f"{tmp_path}/dest/x-1.jpg"),
+        (d, f"{tmp_path}/dest/y-1.jpg"),
+    ]
+    # b is the same as a, which will be at target
+    assert duplicates == [(b, target), (e, existing)]
+
+
+def test_rename_exif(tmp_path):
+    orig = write_jpg(f"{tmp_path}/IMG_0519.jpg", "2020:03:01 12:00:00")
+    renamed = rename_exif(orig, str(tmp_path / "dest"))
+    assert renamed == f"{tmp_path}/dest/2020/2020-03-01_120000_0519.jpg"
+    assert os.path.exists(renamed) and not os.path.exists(orig)
+    # already named for its date
+    assert rename_exif(renamed) == renamed
+    # the same file again is left in place
+    copy = write_jpg(f"{tmp_path}/copy_0519.jpg", "2020:03:01 12:00:00")
+    assert rename_exif(copy, str(tmp_path / "dest")) == renamed
+    assert os.path.exists(copy)
+
+
+def test_rename_exif_no_date(tmp_path):
+    orig = write_jpg(f"{tmp_path}/IMG_0519.jpg", "")
+    with pytest.raises(ValueError):
+        rename_exif(orig)
+    assert os.path.exists(orig)
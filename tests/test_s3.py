@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+from typing import List, Optional
+
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_aws
+import pytest
+
+from util.s3 import (
+    MULTIPART_CHUNKSIZE,
+    MULTIPART_THRESHOLD,
+    file_version,
+    is_changed,
+    list_objects,
+    load_journal,
+    local_etag,
+    s3_client,
+    upload_file,
+    upload_files,
+)
+
+"""
+Tests for util.s3 against a moto bucket.
+"""
+
+BUCKET = "test-bucket"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=BUCKET)
+        yield s3_client()
+
+
+class FlakyClient:
+    """Delegate to client, failing the first failures calls of method with code.
+
+    Calls of method are recorded; if part is set, only calls that upload that part
+    number fail.
+    """
+
+    def __init__(
+        self,
+        client,
+        method: str,
+        failures: int,
+        code: str = "InternalError",
+        part: Optional[int] = None,
+    ):
+        self.client = client
+        self.method = method
+        self.failures = failures
+        self.code = code
+        self.part = part
+        self.calls: List[dict] = []
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.client, name)
+        if name != self.method:
+            return attr
+
+        def call(*args, **kwargs):
+            self.calls.append(kwargs)
+            if self.failures and self.part in (None, kwargs.get("PartNumber")):
+                self.failures -= 1
+                raise ClientError(
+                    {"Error": {"Code": self.code, "Message": "injected"}}, name
+                )
+            return attr(*args, **kwargs)
+
+        return call
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff sleeps instead of sleeping."""
+    waits: list = []
+    monkeypatch.setattr("util.s3.time.sleep", waits.append)
+    return waits
+
+
+def write_file(path: str, size: int) -> str:
+    """Write size bytes that differ in every part, so part MD5s differ."""
+    with open(path, "wb") as f:
+        for offset in range(0, size, MULTIPART_CHUNKSIZE):
+            block = hashlib.sha256(str(offset).encode()).digest()
+            length = min(MULTIPART_CHUNKSIZE, size - offset)
+            f.write((block * (length // len(block) + 1))[:length])
+    return path
+
+
+def remote_etag(client, key: str) -> str:
+    return client.head_object(Bucket=BUCKET, Key=key)["ETag"].strip('"')
+
+
+@pytest.mark.parametrize(
+    "size, parts",
+    [
+        (100_000, 0),
+        (MULTIPART_THRESHOLD - 1, 0),
+        (MULTIPART_THRESHOLD, 1),
+        (2 * MULTIPART_CHUNKSIZE, 2),
+        (2 * MULTIPART_CHUNKSIZE + 1, 3),
+    ],
+)
+def test_local_etag(client, tmp_path, size: int, parts: int):
+    filename = write_file(str(tmp_path / "file"), size)
+    etag = local_etag(filename)
+    if parts:
+        assert etag.endswith(f"-{parts}")
+    else:
+        with open(filename, "rb") as f:
+            assert etag == hashlib.md5(f.read()).hexdigest()
+    # upload_file uses upload_parts at the threshold; boto3's transfer manager
+    # splits files the same way
+    upload_file(client, BUCKET, filename, "ours", {})
+    client.upload_file(filename, BUCKET, "boto3")
+    assert remote_etag(client, "ours") == etag
+    assert remote_etag(client, "boto3") == etag
+
+
+def test_is_changed(client, tmp_path):
+    filename = write_file(str(tmp_path / "file"), MULTIPART_THRESHOLD + 10)
+    assert is_changed(filename, None)
+    upload_file(client, BUCKET, filename, "file", {})
+    assert not is_changed(filename, list_objects(client, BUCKET)["file"])
+    # same size, different content
+    with open(filename, "r+b") as f:
+        f.seek(MULTIPART_CHUNKSIZE + 1)
+        f.write(b"x")
+    assert is_changed(filename, list_objects(client, BUCKET)["file"])
+    with open(filename, "ab") as f:
+        f.write(b"x")
+    assert is_changed(filename, list_objects(client, BUCKET)["file"])
+
+
+def test_list_objects_pages(client):
+    # more keys than one list_objects_v2 page (1000)
+    for idx in range(1001):
+        client.put_object(Bucket=BUCKET, Key=f"trip/{idx:04d}.jpg", Body=b"x" * idx)
+    client.put_object(Bucket=BUCKET, Key="other/0000.jpg", Body=b"")
+    objects = list_objects(client, BUCKET, "trip/")
+    assert len(objects) == 1001
+    assert objects["trip/1000.jpg"] == {
+        "size": 1000,
+        "etag": hashlib.md5(b"x" * 1000).hexdigest(),
+    }
+    assert len(list_objects(client, BUCKET)) == 1002
+
+
+@pytest.mark.parametrize(
+    "size, method",
+    [(1000, "upload_file"), (MULTIPART_THRESHOLD + 1, "upload_part")],
+)
+def test_upload_file_retries(client, tmp_path, sleeps, size: int, method: str):
+    filename = write_file(str(tmp_path / "file"), size)
+    flaky = FlakyClient(client, method, 2)
+    upload_file(flaky, BUCKET, filename, "file", {}, retries=3)
+    assert sleeps == [1, 2]
+    assert remote_etag(client, "file") == local_etag(filename)
+
+
+def test_upload_file_gives_up(client, tmp_path, sleeps):
+    filename = write_file(str(tmp_path / "file"), 1000)
+    flaky = FlakyClient(client, "upload_file", 3)
+    with pytest.raises(ClientError):
+        upload_file(flaky, BUCKET, filename, "file", {}, retries=2)
+    assert len(flaky.calls) == 3
+    assert sleeps == [1, 2]
+
+
+def test_upload_file_restarts_expired_upload(client, tmp_path, sleeps):
+    filename = write_file(str(tmp_path / "file"), MULTIPART_THRESHOLD + 1)
+    journal_filename = str(tmp_path / "journal.json")
+    # an upload from an earlier run, with part 1 done; S3 has since expired it
+    upload_id = client.create_multipart_upload(Bucket=BUCKET, Key="file")["UploadId"]
+    journal = load_journal(None)
+    journal["uploads"]["file"] = {
+        "upload_id": upload_id,
+        "version": file_version(filename),
+        "parts": {"1": '"0123"'},
+    }
+    flaky = FlakyClient(client, "upload_part", 1, "NoSuchUpload")
+    upload_file(
+        flaky,
+        BUCKET,
+        filename,
+        "file",
+        {},
+        journal=journal,
+        journal_filename=journal_filename,
+    )
+    # the retry started a new upload and sent both parts
+    assert len(flaky.calls) == 3
+    assert len(sleeps) == 1
+    assert journal["uploads"] == {}
+    assert remote_etag(client, "file") == local_etag(filename)
+
+
+def test_upload_files_resumes(client, tmp_path, sleeps):
+    small = write_file(str(tmp_path / "small.jpg"), 1000)
+    large = write_file(str(tmp_path / "large.mp4"), 2 * MULTIPART_CHUNKSIZE + 1)
+    uploads = [(small, "small.jpg", {}), (large, "large.mp4", {})]
+    journal_filename = str(tmp_path / "journal.json")
+    # interrupted at part 2 of 3
+    interrupted = FlakyClient(client, "upload_part", 1, part=2)
+    failed = upload_files(
+        interrupted, BUCKET, uploads, retries=0, journal_filename=journal_filename
+    )
+    assert failed == [large]
+    with open(journal_filename) as f:
+        journal = json.load(f)
+    assert list(journal["completed"]) == ["small.jpg"]
+    assert list(journal["uploads"]["large.mp4"]["parts"]) == ["1"]
+    # the rerun skips the small file and sends only the remaining parts
+    parts = FlakyClient(client, "upload_part", 0)
+    small_uploads = FlakyClient(parts, "upload_file", 0)
+    failed = upload_files(
+        small_uploads, BUCKET, uploads, journal_filename=journal_filename
+    )
+    assert failed == []
+    assert small_uploads.calls == []
+    assert [call["PartNumber"] for call in parts.calls] == [2, 3]
+    assert not os.path.exists(journal_filename)
+    assert remote_etag(client, "large.mp4") == local_etag(large)
+    assert remote_etag(client, "small.jpg") == local_etag(small)
@@ -0,0 +1,148 @@
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+"""
+Merge generated photo cards into hand-edited page HTML.
+
+Cards are elements with data-source="file" and an id; they live anywhere inside
+the content element with data-source="files". Everything else in the page is
+hand-edited and kept as is.
+"""
+
+# comments, then start and end tags
+TOKEN_RE = re.compile(
+    r"<!--.*?-->|<(/?)([a-zA-Z][\w:-]*)((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>", re.DOTALL
+)
+ATTR_RE = re.compile(
+    r"([^\s=/>\"']+)(?:\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>\"']+)))?"
+)
+VOID_ELEMENTS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "source",
+    "track",
+    "wbr",
+}
+RAW_TEXT_ELEMENTS = {"script", "style"}
+
+# (start, end, id) of an element in the source html
+Span = Tuple[int, int, str]
+
+
+def parse_attrs(attrs: str) -> Dict[str, str]:
+    return {
+        match.group(1).lower(): next(
+            (g for g in match.group(2, 3, 4) if g is not None), ""
+        )
+        for match in ATTR_RE.finditer(attrs)
+    }
+
+
+def iter_tags(html: str) -> Iterator[Tuple[int, int, bool, str, str]]:
+    """Yield start, end, is_end_tag, name, attrs for each tag in html."""
+    pos = 0
+    while match := TOKEN_RE.search(html, pos):
+        pos = match.end()
+        if match.group(2) is None:
+            continue  # comment
+        name = match.group(2).lower()
+        is_end = bool(match.group(1))
+        yield match.start(), match.end(), is_end, name, match.group(3)
+        if not is_end and name in RAW_TEXT_ELEMENTS:
+            close = re.compile(rf"</{name}\s*>", re.IGNORECASE).search(html, pos)
+            pos = close.start() if close else len(html)
+
+
+def find_elements(html: str) -> Tuple[Optional[Tuple[int, int]], List[Span]]:
+    """Find the content element and the card elements in one pass over html.
+
+    :return: (start, end) of the inner html of the data-source="files" element,
+        and a span for each data-source="file" element, in document order
+    """
+    content: Optional[Tuple[int, int]] = None
+    spans: List[Span] = []
+    # name, start of inner html, data-source, id, start of element
+    stack: List[Tuple[str, int, str, str, int]] = []
+    for start, end, is_end, name, attrs in iter_tags(html):
+        if not is_end:
+            if name in VOID_ELEMENTS or attrs.rstrip().endswith("/"):
+                continue
+            parsed = parse_attrs(attrs)
+            stack.append(
+                (name, end, parsed.get("data-source", ""), parsed.get("id", ""), start)
+            )
+            continue
+        # close the innermost open element with this name; drop unclosed ones
+        for idx in range(len(stack) - 1, -1, -1):
+            if stack[idx][0] == name:
+                break
+        else:
+            continue
+        _, inner_start, source, el_id, el_start = stack[idx]
+        del stack[idx:]
+        if source == "file" and el_id:
+            # skip cards nested inside another card
+            if not any(s[2] == "file" for s in stack):
+                spans.append((el_start, end, el_id))
+        elif source == "files" and content is None:
+            content = (inner_start, start)
+    return content, spans
+
+
+def card_id(card: str) -> str:
+    _, spans = find_elements(card)
+    if not spans:
+        raise ValueError(f'no data-source="file" element in card: {card[:80]}')
+    return spans[0][2]
+
+
+def merge_cards_html(html: str, cards: List[str]) -> Tuple[str, List[str]]:
+    """Merge edited html with generated photo cards.
+
+    merge elements with data-source="file"
+      - if id exists in cards but not in html, add before the first element with a
+        greater id, or after the last element
+      - if id exists in html but not in cards, remove
+      - if id exists in both, replace with cards version
+
+    :param html: edited page
+    :param cards: generated HTML for each card
+    :return: inner html of the data-source="files" element, and messages
+    """
+    content, spans = find_elements(html)
+    if content is None:
+        raise ValueError('no data-source="files" element in html')
+    cards_by_id = {card_id(card): card.strip() for card in cards}
+    spans = [s for s in spans if content[0] <= s[0] and s[1] <= content[1]]
+    to_add = sorted(set(cards_by_id) - set(s[2] for s in spans))
+    messages: List[str] = []
+    parts: List[str] = []
+    pos = content[0]
+    add_idx = 0
+    for start, end, el_id in spans:
+        parts.append(html[pos:start])
+        # insert new cards with ids less than this one
+        while add_idx < len(to_add) and to_add[add_idx] < el_id:
+            messages.append(f"adding card {to_add[add_idx]} before {el_id}")
+            parts.append(cards_by_id[to_add[add_idx]] + "\n")
+            add_idx += 1
+        if el_id in cards_by_id:
+            parts.append(cards_by_id[el_id])
+        else:
+            messages.append(f"removing {el_id}; not in album")
+        pos = end
+    prev_id = spans[-1][2] if spans else "start"
+    for el_id in to_add[add_idx:]:
+        messages.append(f"adding card {el_id} after {prev_id}")
+        parts.append("\n" + cards_by_id[el_id])
+        prev_id = el_id
+    parts.append(html[pos : content[1]])
+    return "".join(parts).strip(), messages
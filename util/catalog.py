@@ -0,0 +1,254 @@
+from datetime import datetime
+import os
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from util.dates import parse_filename_datetime
+from util.metadata import read_metadata
+from util.mp4 import mp4_creation_time, read_mp4_info
+from util.photos import filename_datetime, metadata_exif_datetime
+from util.s3 import load_manifest, local_etag
+
+"""
+SQLite catalog of photos and videos under a root directory.
+
+Each row holds the path relative to root, size, mtime, content hash (S3 ETag),
+capture datetime, GPS, caption, dimensions, and media type. refresh_catalog only
+reads files whose size or mtime changed since the last refresh, so queries like
+photos between two dates or photos without GPS don't need to scan the tree.
+
+The catalog is in root/.catalog.sqlite by default.
+"""
+
+CATALOG_FILENAME = ".catalog.sqlite"
+MEDIA_TYPES = {
+    "jpg": "image",
+    "jpeg": "image",
+    "mp4": "video",
+    "mov": "video",
+}
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS photos (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    hash TEXT,
+    captured_at TEXT,
+    latitude REAL,
+    longitude REAL,
+    altitude REAL,
+    caption TEXT,
+    width INTEGER,
+    height INTEGER,
+    media_type TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS photos_captured_at ON photos (captured_at);
+CREATE INDEX IF NOT EXISTS photos_latitude ON photos (latitude);
+CREATE INDEX IF NOT EXISTS photos_hash ON photos (hash);
+"""
+# captured_at is stored as text that sorts by time
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def open_catalog(root: str, filename: Optional[str] = None) -> sqlite3.Connection:
+    """Open (and create if needed) the catalog for root."""
+    conn = sqlite3.connect(filename or f"{root}/{CATALOG_FILENAME}")
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def is_empty(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM photos LIMIT 1").fetchone() is None
+
+
+def media_files(root: str) -> Dict[str, os.stat_result]:
+    """Return path relative to root -> stat for photos and videos under root."""
+    files: Dict[str, os.stat_result] = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for filename in filenames:
+            if filename.split(".")[-1].lower() not in MEDIA_TYPES:
+                continue
+            full_path = os.path.join(dirpath, filename)
+            files[os.path.relpath(full_path, root)] = os.stat(full_path)
+    return files
+
+
+def read_entry(
+    root: str, path: str, stat: os.stat_result, etag: Optional[str] = None
+) -> tuple:
+    """Read metadata for one file; return a row for the photos table.
+
+    :param etag: hash of the file if already known
+    """
+    full_path = os.path.join(root, path)
+    media_type = MEDIA_TYPES[path.split(".")[-1].lower()]
+    metadata: dict = {}
+    captured_at: Optional[datetime] = None
+    if media_type == "image":
+        try:
+            metadata = read_metadata(full_path)
+        except Exception as exc:
+            print(f"{path}\terror reading metadata: {exc}")
+        captured_at = metadata_exif_datetime(metadata)
+    else:
+        try:
+            metadata = read_mp4_info(full_path)
+        except Exception as exc:
+            print(f"{path}\terror reading metadata: {exc}")
+        captured_at = mp4_creation_time(metadata)
+    if not captured_at:
+        try:
+            captured_at = filename_datetime(path)
+        except ValueError:
+            pass
+    return (
+        path,
+        stat.st_size,
+        stat.st_mtime_ns,
+        etag or local_etag(full_path),
+        captured_at.strftime(DATETIME_FORMAT) if captured_at else None,
+        metadata.get("latitude"),
+        metadata.get("longitude"),
+        metadata.get("altitude"),
+        metadata.get("description", "").strip() or None,
+        metadata.get("width"),
+        metadata.get("height"),
+        media_type,
+    )
+
+
+def write_entries(
+    conn: sqlite3.Connection,
+    root: str,
+    changed: List[Tuple[str, os.stat_result]],
+    removed: List[str],
+) -> Tuple[int, int]:
+    """Read and store rows for changed files; delete rows for removed paths.
+
+    Hashes are taken from the S3 manifest under root when it has the same
+    version of a file, so files already synced aren't read twice.
+
+    :return: number of files read, number of rows removed
+    """
+    s3_manifest = load_manifest(root)
+
+    def etag(path: str, stat: os.stat_result) -> Optional[str]:
+        entry = s3_manifest.get(path)
+        if entry and (entry["size"], entry["mtime"]) == (
+            stat.st_size,
+            stat.st_mtime_ns,
+        ):
+            return entry["etag"]
+        return None
+
+    print(f"catalog {root}: {len(changed)} new or changed, {len(removed)} removed")
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO photos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (read_entry(root, path, stat, etag(path, stat)) for path, stat in changed),
+        )
+        conn.executemany(
+            "DELETE FROM photos WHERE path = ?", [(path,) for path in removed]
+        )
+    return len(changed), len(removed)
+
+
+def refresh_catalog(conn: sqlite3.Connection, root: str) -> Tuple[int, int]:
+    """Update the catalog for files added, changed, or removed under root.
+
+    :return: number of files read, number of rows removed
+    """
+    known = {
+        row["path"]: (row["size"], row["mtime"])
+        for row in conn.execute("SELECT path, size, mtime FROM photos")
+    }
+    files = media_files(root)
+    changed = [
+        (path, stat)
+        for path, stat in sorted(files.items())
+        if known.get(path) != (stat.st_size, stat.st_mtime_ns)
+    ]
+    removed = [path for path in known if path not in files]
+    return write_entries(conn, root, changed, removed)
+
+
+def refresh_paths(
+    conn: sqlite3.Connection, root: str, paths: List[str]
+) -> Tuple[int, int]:
+    """Update the catalog for paths only, without walking root.
+
+    Only these files are stat'ed; rows for files that no longer exist are removed.
+
+    :param paths: paths relative to root
+    :return: number of files read, number of rows removed
+    """
+    changed: List[Tuple[str, os.stat_result]] = []
+    removed: List[str] = []
+    for path in paths:
+        try:
+            stat = os.stat(os.path.join(root, path))
+        except FileNotFoundError:
+            removed.append(path)
+            continue
+        row = conn.execute(
+            "SELECT size, mtime FROM photos WHERE path = ?", (path,)
+        ).fetchone()
+        if not row or (row["size"], row["mtime"]) != (stat.st_size, stat.st_mtime_ns):
+            changed.append((path, stat))
+    return write_entries(conn, root, changed, removed)
+
+
+def photos_between(
+    conn: sqlite3.Connection, start: datetime, end: datetime
+) -> List[sqlite3.Row]:
+    """Return files captured between start and end, inclusive, in time order."""
+    return conn.execute(
+        "SELECT * FROM photos WHERE captured_at BETWEEN ? AND ? ORDER BY captured_at",
+        (start.strftime(DATETIME_FORMAT), end.strftime(DATETIME_FORMAT)),
+    ).fetchall()
+
+
+def photos_without_gps(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+    """Return images without GPS coordinates."""
+    return conn.execute(
+        "SELECT * FROM photos WHERE media_type = 'image' AND latitude IS NULL "
+        "ORDER BY path"
+    ).fetchall()
+
+
+def photos_without_date(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+    """Return files without a capture datetime."""
+    return conn.execute(
+        "SELECT * FROM photos WHERE captured_at IS NULL ORDER BY path"
+    ).fetchall()
+
+
+def images_captured(
+    conn: sqlite3.Connection, end: datetime, start: Optional[datetime] = None
+) -> List[sqlite3.Row]:
+    """Return images captured at or before end, and at or after start if set."""
+    return conn.execute(
+        "SELECT * FROM photos WHERE media_type = 'image' "
+        "AND captured_at BETWEEN ? AND ? ORDER BY captured_at",
+        (
+            start.strftime(DATETIME_FORMAT) if start else "",
+            end.strftime(DATETIME_FORMAT),
+        ),
+    ).fetchall()
+
+
+def dated_images(
+    rows: Iterable[sqlite3.Row], root: str
+) -> Iterator[Tuple[str, int, Optional[datetime]]]:
+    """Yield path, size, and datetime for rows, like util.photos.dated_files.
+
+    The datetime comes from the filename if it has one; otherwise the capture
+    datetime.
+    """
+    for row in rows:
+        dt = parse_filename_datetime(os.path.basename(row["path"]))
+        if not dt and row["captured_at"]:
+            dt = datetime.strptime(row["captured_at"], DATETIME_FORMAT)
+        yield os.path.join(root, row["path"]), row["size"], dt
@@ -0,0 +1,100 @@
+import math
+from typing import Dict, List, Tuple
+
+"""
+Cluster map points for each zoom level, like supercluster
+(https://github.com/mapbox/supercluster), at build time.
+
+Points are projected to web mercator coordinates in [0, 1]. Starting from the
+points at max_zoom + 1, each zoom level greedily merges points within radius
+pixels of an unclustered point into one cluster, then uses those clusters as the
+input for the next lower zoom. A grid of cells the size of the radius finds
+neighbors, so each level is linear in the number of points.
+"""
+
+
+def project(longitude: float, latitude: float) -> Tuple[float, float]:
+    """Return web mercator x, y in [0, 1]."""
+    sin = math.sin(math.radians(max(min(latitude, 85.0511), -85.0511)))
+    y = 0.5 - 0.25 * math.log((1 + sin) / (1 - sin)) / math.pi
+    return longitude / 360 + 0.5, min(max(y, 0.0), 1.0)
+
+
+def unproject(x: float, y: float) -> Tuple[float, float]:
+    """Return longitude, latitude for web mercator x, y."""
+    latitude = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return (x - 0.5) * 360, latitude
+
+
+def cluster_level(clusters: List[dict], radius: float) -> List[dict]:
+    """Merge clusters within radius (in projected units) of each other."""
+    grid: Dict[Tuple[int, int], List[int]] = {}
+    for idx, cluster in enumerate(clusters):
+        cell = (int(cluster["x"] / radius), int(cluster["y"] / radius))
+        grid.setdefault(cell, []).append(idx)
+    visited = [False] * len(clusters)
+    radius_sq = radius * radius
+    merged: List[dict] = []
+    for idx, cluster in enumerate(clusters):
+        if visited[idx]:
+            continue
+        visited[idx] = True
+        x, y, count = cluster["x"], cluster["y"], cluster["count"]
+        wx, wy = x * count, y * count
+        top = cluster
+        cx, cy = int(x / radius), int(y / radius)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for other_idx in grid.get((cx + dx, cy + dy), []):
+                    if visited[other_idx]:
+                        continue
+                    other = clusters[other_idx]
+                    if (other["x"] - x) ** 2 + (other["y"] - y) ** 2 > radius_sq:
+                        continue
+                    visited[other_idx] = True
+                    count += other["count"]
+                    wx += other["x"] * other["count"]
+                    wy += other["y"] * other["count"]
+                    if other["count"] > top["count"]:
+                        top = other
+        # the largest cluster (or first point) represents the merged cluster
+        merged.append(
+            {"x": wx / count, "y": wy / count, "count": count, "image": top["image"]}
+        )
+    return merged
+
+
+def cluster_points(
+    points: List[Tuple[float, float, str]],
+    min_zoom: int = 0,
+    max_zoom: int = 7,
+    radius: int = 60,
+    extent: int = 512,
+) -> Dict[int, List[dict]]:
+    """Cluster points for each zoom from max_zoom down to min_zoom.
+
+    :param points: longitude, latitude, and image for each point
+    :param radius: cluster radius in pixels
+    :param extent: tile size in pixels
+    :return: clusters for each zoom, with longitude, latitude, count, and image of a
+        representative point
+    """
+    clusters: List[dict] = []
+    for lng, lat, image in points:
+        x, y = project(lng, lat)
+        clusters.append({"x": x, "y": y, "count": 1, "image": image})
+    levels: Dict[int, List[dict]] = {}
+    for zoom in range(max_zoom, min_zoom - 1, -1):
+        clusters = cluster_level(clusters, radius / (extent * 2**zoom))
+        levels[zoom] = []
+        for cluster in clusters:
+            lng, lat = unproject(cluster["x"], cluster["y"])
+            levels[zoom].append(
+                {
+                    "longitude": lng,
+                    "latitude": lat,
+                    "count": cluster["count"],
+                    "image": cluster["image"],
+                }
+            )
+    return levels
@@ -0,0 +1,72 @@
+from datetime import datetime
+import re
+from typing import Iterable, List, Optional
+
+"""
+Parse the datetime formats used in photo filenames and EXIF.
+
+  2020-07-04_21-00-11.jpg - Amazon photos
+  IMG_20140629_103425.jpg - Android
+  2024-07-20_093327_01636776.jpg - renamed by rename_exif and apple/main.py
+  2021:08:06 16:07:56 - EXIF DateTime and DateTimeOriginal
+
+One compiled regex finds where the date starts in a filename; the fields are
+then read at fixed offsets, which is much faster than strptime or dateutil.
+"""
+
+# match length -> offsets of year, month, day, hour, minute, second
+FILENAME_OFFSETS = {
+    19: (0, 5, 8, 11, 14, 17),  # 2020-07-04_21-00-11
+    17: (0, 5, 8, 11, 13, 15),  # 2024-07-20_093327
+    15: (0, 4, 6, 9, 11, 13),  # 20140629_103425
+}
+FILENAME_RE = re.compile(
+    r"\d{4}(?:-\d\d-\d\d_(?:\d\d-\d\d-\d\d|\d{6})|\d{4}_\d{6})", re.ASCII
+)
+EXIF_RE = re.compile(r"\d{4}:\d\d:\d\d \d\d:\d\d:\d\d", re.ASCII)
+
+
+def parse_filename_datetime(filename: str) -> Optional[datetime]:
+    """Return the datetime in filename, or None if there isn't a valid one."""
+    match = FILENAME_RE.search(filename)
+    if not match:
+        return None
+    value = match.group()
+    y, mo, d, h, mi, s = FILENAME_OFFSETS[len(value)]
+    try:
+        return datetime(
+            int(value[y : y + 4]),
+            int(value[mo : mo + 2]),
+            int(value[d : d + 2]),
+            int(value[h : h + 2]),
+            int(value[mi : mi + 2]),
+            int(value[s : s + 2]),
+        )
+    except ValueError:
+        return None
+
+
+def parse_filename_datetimes(filenames: Iterable[str]) -> List[Optional[datetime]]:
+    """Return the datetime in each filename, or None if there isn't a valid one."""
+    return [parse_filename_datetime(filename) for filename in filenames]
+
+
+def parse_exif_datetime(value: str) -> Optional[datetime]:
+    """Return the datetime for an EXIF value like 2021:08:06 16:07:56, or None.
+
+    Cameras without a clock set write 0000:00:00 00:00:00 or blanks; these return
+    None.
+    """
+    if not EXIF_RE.match(value):
+        return None
+    try:
+        return datetime(
+            int(value[0:4]),
+            int(value[5:7]),
+            int(value[8:10]),
+            int(value[11:13]),
+            int(value[14:16]),
+            int(value[17:19]),
+        )
+    except ValueError:
+        return None
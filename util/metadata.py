@@ -0,0 +1,213 @@
+import struct
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+
+"""
+Read JPEG metadata from the segments before the image data.
+
+Walk the JPEG markers from the start of the file, parse the APP1 Exif and XMP
+and APP13 IPTC segments, read dimensions from the SOF segment, and stop at the
+SOS marker (start of compressed image data). Other segments are skipped with a
+seek, so only the file header is read.
+
+read_metadata returns a dict; keys are only set if present in the file
+  datetime - EXIF DateTime, as written: 2021:08:06 16:07:56
+  datetime_original - EXIF DateTimeOriginal
+  description - EXIF ImageDescription
+  orientation - EXIF Orientation
+  width, height - image dimensions
+  gps_latitude, gps_longitude - (degrees, minutes, seconds)
+  gps_latitude_ref, gps_longitude_ref - N/S, E/W
+  latitude, longitude - decimal degrees, negative if S or W
+  altitude - meters, negative if below sea level
+  iptc_caption - IPTC Caption-Abstract
+  xmp - XMP packet
+"""
+
+EXIF_HEADER = b"Exif\x00\x00"
+XMP_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+PHOTOSHOP_HEADER = b"Photoshop 3.0\x00"
+# start of frame markers, except DHT (C4), JPG (C8), and DAC (CC)
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+SOS = 0xDA
+EOI = 0xD9
+# markers without a length
+STANDALONE_MARKERS = set(range(0xD0, 0xD8)) | {0x01}
+
+# TIFF tags
+IMAGE_DESCRIPTION = 0x010E
+ORIENTATION = 0x0112
+DATETIME = 0x0132
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+DATETIME_ORIGINAL = 0x9003
+GPS_LATITUDE_REF = 1
+GPS_LATITUDE = 2
+GPS_LONGITUDE_REF = 3
+GPS_LONGITUDE = 4
+GPS_ALTITUDE_REF = 5
+GPS_ALTITUDE = 6
+
+# TIFF type -> struct format, size
+TIFF_TYPES = {
+    1: ("B", 1),  # BYTE
+    2: ("s", 1),  # ASCII
+    3: ("H", 2),  # SHORT
+    4: ("L", 4),  # LONG
+    5: ("LL", 8),  # RATIONAL
+    7: ("s", 1),  # UNDEFINED
+    9: ("l", 4),  # SLONG
+    10: ("ll", 8),  # SRATIONAL
+}
+
+
+def decode_text(value: bytes) -> str:
+    return value.split(b"\x00")[0].decode("utf-8", errors="replace")
+
+
+def read_ifd(tiff: bytes, offset: int, order: str) -> Dict[int, Any]:
+    """Return tag -> value for the entries in the IFD at offset.
+
+    ASCII values are returned as str; numbers as a value or tuple; rationals as
+    float.
+    """
+    entries: Dict[int, Any] = {}
+    if offset + 2 > len(tiff):
+        return entries
+    (count,) = struct.unpack_from(f"{order}H", tiff, offset)
+    for idx in range(count):
+        entry = offset + 2 + idx * 12
+        if entry + 12 > len(tiff):
+            break
+        tag, type_id, num = struct.unpack_from(f"{order}HHL", tiff, entry)
+        if type_id not in TIFF_TYPES:
+            continue
+        fmt, size = TIFF_TYPES[type_id]
+        length = size * num
+        if length <= 4:
+            value_offset = entry + 8
+        else:
+            (value_offset,) = struct.unpack_from(f"{order}L", tiff, entry + 8)
+        if value_offset + length > len(tiff):
+            continue
+        if fmt == "s":
+            raw = tiff[value_offset : value_offset + length]
+            entries[tag] = decode_text(raw) if type_id == 2 else raw
+            continue
+        values = struct.unpack_from(f"{order}{fmt * num}", tiff, value_offset)
+        if type_id in (5, 10):
+            values = tuple(
+                values[i] / values[i + 1] if values[i + 1] else 0.0
+                for i in range(0, len(values), 2)
+            )
+        entries[tag] = values[0] if num == 1 else values
+    return entries
+
+
+def dms_to_decimal(dms: Tuple[float, float, float], ref: Optional[str]) -> float:
+    degrees, minutes, seconds = dms
+    decimal = degrees + minutes / 60 + seconds / 3600
+    return -decimal if ref in ("S", "W") else decimal
+
+
+def parse_exif(segment: bytes, metadata: Dict[str, Any]):
+    """Add values from an APP1 Exif segment (after the Exif header) to metadata."""
+    if len(segment) < 8 or segment[:2] not in (b"II", b"MM"):
+        return
+    order = "<" if segment[:2] == b"II" else ">"
+    (ifd0_offset,) = struct.unpack_from(f"{order}L", segment, 4)
+    ifd0 = read_ifd(segment, ifd0_offset, order)
+    if isinstance(ifd0.get(IMAGE_DESCRIPTION), str):
+        metadata["description"] = ifd0[IMAGE_DESCRIPTION]
+    if isinstance(ifd0.get(ORIENTATION), int):
+        metadata["orientation"] = ifd0[ORIENTATION]
+    if isinstance(ifd0.get(DATETIME), str):
+        metadata["datetime"] = ifd0[DATETIME]
+    if isinstance(ifd0.get(EXIF_IFD), int):
+        exif_ifd = read_ifd(segment, ifd0[EXIF_IFD], order)
+        if isinstance(exif_ifd.get(DATETIME_ORIGINAL), str):
+            metadata["datetime_original"] = exif_ifd[DATETIME_ORIGINAL]
+    if not isinstance(ifd0.get(GPS_IFD), int):
+        return
+    gps = read_ifd(segment, ifd0[GPS_IFD], order)
+    for name, tag, ref_tag in [
+        ("latitude", GPS_LATITUDE, GPS_LATITUDE_REF),
+        ("longitude", GPS_LONGITUDE, GPS_LONGITUDE_REF),
+    ]:
+        if not isinstance(gps.get(tag), tuple) or len(gps[tag]) != 3:
+            continue
+        ref = gps.get(ref_tag) if isinstance(gps.get(ref_tag), str) else None
+        metadata[f"gps_{name}"] = gps[tag]
+        metadata[f"gps_{name}_ref"] = ref
+        metadata[name] = dms_to_decimal(gps[tag], ref)
+    if isinstance(gps.get(GPS_ALTITUDE), float):
+        below_sea_level = gps.get(GPS_ALTITUDE_REF) == 1
+        metadata["altitude"] = (
+            -gps[GPS_ALTITUDE] if below_sea_level else gps[GPS_ALTITUDE]
+        )
+
+
+def parse_iptc(segment: bytes, metadata: Dict[str, Any]):
+    """Add the IPTC caption from an APP13 Photoshop segment to metadata."""
+    # 8BIM resource 0x0404 holds IPTC records: 0x1C, record, dataset, size, data
+    start = segment.find(b"8BIM\x04\x04")
+    if start < 0:
+        return
+    pos = segment.find(b"\x1c", start)
+    while 0 <= pos and pos + 5 <= len(segment) and segment[pos] == 0x1C:
+        record, dataset, size = struct.unpack_from(">BBH", segment, pos + 1)
+        if record == 2 and dataset == 120:
+            metadata["iptc_caption"] = decode_text(segment[pos + 5 : pos + 5 + size])
+            return
+        pos += 5 + size
+
+
+def read_metadata_file(f: BinaryIO) -> Dict[str, Any]:
+    """Read metadata from the JPEG segments before the image data in open file f."""
+    metadata: Dict[str, Any] = {}
+    if f.read(2) != b"\xff\xd8":
+        raise ValueError("not a JPEG file")
+    while True:
+        byte = f.read(1)
+        if not byte:
+            break
+        if byte != b"\xff":
+            continue
+        marker = f.read(1)
+        # skip fill bytes
+        while marker == b"\xff":
+            marker = f.read(1)
+        if not marker:
+            break
+        code = marker[0]
+        if code in (SOS, EOI):
+            break
+        if code in STANDALONE_MARKERS:
+            continue
+        header = f.read(2)
+        if len(header) < 2:
+            break
+        (length,) = struct.unpack(">H", header)
+        if code == 0xE1 or code == 0xED:
+            segment = f.read(length - 2)
+            if segment.startswith(EXIF_HEADER):
+                parse_exif(segment[len(EXIF_HEADER) :], metadata)
+            elif segment.startswith(XMP_HEADER):
+                metadata["xmp"] = segment[len(XMP_HEADER) :].decode(
+                    "utf-8", errors="replace"
+                )
+            elif segment.startswith(PHOTOSHOP_HEADER):
+                parse_iptc(segment, metadata)
+        elif code in SOF_MARKERS:
+            segment = f.read(length - 2)
+            if len(segment) >= 5:
+                height, width = struct.unpack_from(">HH", segment, 1)
+                metadata["width"], metadata["height"] = width, height
+        else:
+            f.seek(length - 2, 1)
+    return metadata
+
+
+def read_metadata(fn: str) -> Dict[str, Any]:
+    """Read metadata from the header of JPEG file fn."""
+    with open(fn, "rb") as f:
+        return read_metadata_file(f)
@@ -0,0 +1,383 @@
+from datetime import datetime, timedelta, timezone
+import os
+import shutil
+import struct
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional, Tuple
+
+"""
+Read metadata from MP4 and QuickTime (ISO base media) files.
+
+A file is a tree of boxes: a 4 byte size, a 4 byte type, then the payload.
+read_mp4_info walks the top-level boxes by seeking from header to header, so
+mdat (the media data) is never read; only moov, with the movie and track
+headers and metadata, is loaded.
+
+read_mp4_info returns a dict; keys are only set if present in the file
+  creation_time - mvhd creation time, as a naive UTC datetime (like ffmpeg's
+    creation_time)
+  duration - seconds
+  width, height - from the first video track
+  video_codec - sample entry type of the first video track: avc1, hvc1, ...
+  creationdate - com.apple.quicktime.creationdate, as written:
+    2023-05-06T07:08:09-0700
+  day - ©day, as written
+
+faststart rewrites a file with moov ahead of mdat, so browsers can start
+playing before the whole file is downloaded.
+"""
+
+# seconds from 1904-01-01 (QuickTime epoch) to 1970-01-01
+EPOCH_OFFSET = 2082844800
+# boxes whose payload is only child boxes
+CONTAINER_BOXES = {b"mdia", b"minf", b"stbl"}
+DAY = b"\xa9day"
+
+# boxes that contain the sample tables with chunk offsets
+OFFSET_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+COPY_CHUNKSIZE = 1024 * 1024
+
+# type, start of payload, end of box
+Box = Tuple[bytes, int, int]
+
+
+def iter_boxes(f: BinaryIO, start: int, end: int) -> Iterator[Box]:
+    """Yield the boxes between start and end of open file f, reading only headers.
+
+    Stops at the first header that is cut off or has an invalid size.
+    """
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">L4s", header)
+        payload = pos + 8
+        if size == 1:
+            largesize = f.read(8)
+            if len(largesize) < 8 or payload + 8 > end:
+                return
+            (size,) = struct.unpack(">Q", largesize)
+            payload += 8
+        elif size == 0:
+            size = end - pos
+        if size < payload - pos:
+            return
+        yield box_type, payload, min(pos + size, end)
+        pos += size
+
+
+def iter_payload_boxes(data: bytes, start: int = 0) -> Iterator[Tuple[bytes, bytes]]:
+    """Yield type and payload for the boxes in data, from start."""
+    pos = start
+    while pos + 8 <= len(data):
+        size, box_type = struct.unpack_from(">L4s", data, pos)
+        header = 8
+        if size == 1:
+            if pos + 16 > len(data):
+                return
+            (size,) = struct.unpack_from(">Q", data, pos + 8)
+            header = 16
+        elif size == 0:
+            size = len(data) - pos
+        if size < header:
+            return
+        yield box_type, data[pos + header : pos + size]
+        pos += size
+
+
+def mp4_datetime(seconds: int) -> Optional[datetime]:
+    """Return a naive UTC datetime for seconds since 1904, or None if not set."""
+    if not seconds:
+        return None
+    # like ffmpeg, accept times written from 1970 by mistake
+    if seconds >= EPOCH_OFFSET:
+        seconds -= EPOCH_OFFSET
+    try:
+        return datetime(1970, 1, 1) + timedelta(seconds=seconds)
+    except OverflowError:
+        return None
+
+
+def parse_mvhd(data: bytes, info: Dict[str, Any]):
+    # version 1 has 64 bit times and duration
+    fmt = ">QQLQ" if data[:1] == b"\x01" else ">LLLL"
+    if len(data) < 4 + struct.calcsize(fmt):
+        return
+    creation, _, timescale, duration = struct.unpack_from(fmt, data, 4)
+    if dt := mp4_datetime(creation):
+        info["creation_time"] = dt
+    if timescale:
+        info["duration"] = duration / timescale
+
+
+def parse_tkhd(data: bytes, track: Dict[str, Any]):
+    # version, flags, times, track id, duration, reserved, layer, group, volume,
+    # reserved, matrix, then width and height as 16.16 fixed point
+    offset = 88 if data[:1] == b"\x01" else 76
+    if len(data) < offset + 8:
+        return
+    width, height = struct.unpack_from(">LL", data, offset)
+    if width and height:
+        track["width"], track["height"] = width >> 16, height >> 16
+
+
+def parse_trak(data: bytes, info: Dict[str, Any]):
+    """Add dimensions and codec of the first video track to info."""
+    track: Dict[str, Any] = {}
+    parse_moov(data, track)
+    if track.get("handler") != "vide" or "video_codec" in info:
+        return
+    for key in ["width", "height", "video_codec"]:
+        if key in track:
+            info[key] = track[key]
+
+
+def meta_children(data: bytes) -> Iterator[Tuple[bytes, bytes]]:
+    """Yield the boxes in a meta box; in MP4 it has version and flags first."""
+    start = 0 if data[4:8] in (b"hdlr", b"keys", b"ilst") else 4
+    return iter_payload_boxes(data, start)
+
+
+def data_value(item: bytes) -> Optional[str]:
+    """Return the text in the data box of an ilst item."""
+    for box_type, payload in iter_payload_boxes(item):
+        if box_type == b"data" and len(payload) >= 8:
+            return payload[8:].decode("utf-8", errors="replace")
+    return None
+
+
+def parse_meta(data: bytes, info: Dict[str, Any]):
+    """Add ©day and QuickTime metadata keys (mdta) to info."""
+    keys: Dict[int, str] = {}
+    items: Dict[bytes, bytes] = {}
+    for box_type, payload in meta_children(data):
+        if box_type == b"keys" and len(payload) >= 8:
+            (count,) = struct.unpack_from(">L", payload, 4)
+            pos = 8
+            for idx in range(1, count + 1):
+                if pos + 8 > len(payload):
+                    break
+                (size,) = struct.unpack_from(">L", payload, pos)
+                keys[idx] = payload[pos + 8 : pos + size].decode(
+                    "utf-8", errors="replace"
+                )
+                pos += max(size, 8)
+        elif box_type == b"ilst":
+            items.update(iter_payload_boxes(payload))
+    for box_type, item in items.items():
+        if box_type == DAY:
+            info.setdefault("day", data_value(item))
+            continue
+        (idx,) = struct.unpack(">L", box_type)
+        if keys.get(idx) == "com.apple.quicktime.creationdate":
+            info["creationdate"] = data_value(item)
+
+
+def parse_udta(data: bytes, info: Dict[str, Any]):
+    for box_type, payload in iter_payload_boxes(data):
+        if box_type == DAY and len(payload) >= 4:
+            # QuickTime text: 2 byte length, 2 byte language, text
+            (length,) = struct.unpack_from(">H", payload)
+            info["day"] = payload[4 : 4 + length].decode("utf-8", errors="replace")
+        elif box_type == b"meta":
+            parse_meta(payload, info)
+
+
+def parse_moov(data: bytes, info: Dict[str, Any]):
+    for box_type, payload in iter_payload_boxes(data):
+        if box_type == b"mvhd":
+            parse_mvhd(payload, info)
+        elif box_type == b"trak":
+            parse_trak(payload, info)
+        elif box_type == b"tkhd":
+            parse_tkhd(payload, info)
+        elif box_type == b"hdlr" and len(payload) >= 12:
+            # version, flags, predefined, handler type; in MOV, minf also has a
+            # data handler, after the media handler in mdia
+            info.setdefault("handler", payload[8:12].decode("latin-1"))
+        elif box_type == b"stsd" and len(payload) >= 16:
+            # version, flags, entry count, then size and type of each entry
+            info["video_codec"] = payload[12:16].decode("latin-1")
+        elif box_type == b"meta":
+            parse_meta(payload, info)
+        elif box_type == b"udta":
+            parse_udta(payload, info)
+        elif box_type in CONTAINER_BOXES:
+            parse_moov(payload, info)
+
+
+def read_mp4_info_file(f: BinaryIO) -> Dict[str, Any]:
+    """Read metadata from the moov box of open file f."""
+    info: Dict[str, Any] = {}
+    f.seek(0, os.SEEK_END)
+    end = f.tell()
+    for box_type, start, box_end in iter_boxes(f, 0, end):
+        if box_type == b"moov":
+            f.seek(start)
+            try:
+                parse_moov(f.read(box_end - start), info)
+            except struct.error:
+                # truncated or corrupt box; keep what was read before it
+                pass
+            break
+    return info
+
+
+def read_mp4_info(filename: str) -> Dict[str, Any]:
+    """Read metadata from the moov box of MP4 or MOV file filename."""
+    with open(filename, "rb") as f:
+        return read_mp4_info_file(f)
+
+
+def parse_creationdate(value: str) -> Optional[datetime]:
+    """Return a naive UTC datetime for an ISO 8601 date, or None if invalid.
+
+    Dates without an offset are taken as UTC.
+    """
+    try:
+        dt = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def mp4_creation_time(info: Dict[str, Any]) -> Optional[datetime]:
+    """Return the creation time from read_mp4_info, as naive UTC.
+
+    Use the movie header creation time, like ffmpeg's creation_time; if it's not
+    set, use com.apple.quicktime.creationdate or ©day metadata.
+    """
+    if info.get("creation_time"):
+        return info["creation_time"]
+    for key in ["creationdate", "day"]:
+        if info.get(key) and (dt := parse_creationdate(info[key])):
+            return dt
+    return None
+
+
+def patch_chunk_offsets(
+    moov: bytearray, start: int, end: int, shift: Callable[[int], int]
+) -> bool:
+    """Update the stco and co64 chunk offsets in moov[start:end] with shift.
+
+    :param shift: function from old offset to new offset
+    :return: false if a new offset doesn't fit in a 32 bit stco entry
+    """
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack_from(">L4s", moov, pos)
+        header = 8
+        if size == 1:
+            (size,) = struct.unpack_from(">Q", moov, pos + 8)
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            raise ValueError(f"invalid {box_type!r} box size {size}")
+        payload = pos + header
+        if box_type in OFFSET_CONTAINERS:
+            if not patch_chunk_offsets(moov, payload, pos + size, shift):
+                return False
+        elif box_type in (b"stco", b"co64"):
+            # version, flags, entry count, then offsets
+            (count,) = struct.unpack_from(">L", moov, payload + 4)
+            fmt = ">L" if box_type == b"stco" else ">Q"
+            width = struct.calcsize(fmt)
+            for idx in range(count):
+                entry = payload + 8 + idx * width
+                (offset,) = struct.unpack_from(fmt, moov, entry)
+                offset = shift(offset)
+                if offset >= 1 << (8 * width):
+                    return False
+                struct.pack_into(fmt, moov, entry, offset)
+        pos += size
+    return True
+
+
+def copy_range(fsrc: BinaryIO, fdst: BinaryIO, start: int, end: int):
+    """Copy bytes start to end of fsrc to fdst, COPY_CHUNKSIZE at a time."""
+    fsrc.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = fsrc.read(min(COPY_CHUNKSIZE, remaining))
+        if not chunk:
+            raise ValueError("unexpected end of file")
+        fdst.write(chunk)
+        remaining -= len(chunk)
+
+
+def needs_faststart(filename: str) -> bool:
+    """Return true if filename has a moov box after its first mdat box."""
+    with open(filename, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        seen_mdat = False
+        for box_type, _, _ in iter_boxes(f, 0, f.tell()):
+            if box_type == b"mdat":
+                seen_mdat = True
+            elif box_type == b"moov":
+                return seen_mdat
+    return False
+
+
+def faststart(src: str, dest: str) -> bool:
+    """Write src to dest with the moov box before the first mdat box.
+
+    Chunk offsets in moov are updated for the media data moving back by the
+    size of moov. The media data is streamed, so memory use is the size of moov
+    plus COPY_CHUNKSIZE. If src already starts fast, or its offsets can't be
+    updated, it's copied unchanged.
+
+    :return: true if moov was moved
+    :raises ValueError: if the boxes in moov can't be parsed; dest is not written
+    """
+    with open(src, "rb") as fsrc:
+        fsrc.seek(0, os.SEEK_END)
+        file_end = fsrc.tell()
+        boxes = list(iter_boxes(fsrc, 0, file_end))
+        # start of each box: payload start minus header size
+        starts = [0] + [box_end for _, _, box_end in boxes[:-1]]
+        types = [box_type for box_type, _, _ in boxes]
+        if b"moov" not in types or b"mdat" not in types:
+            shutil.copyfile(src, dest)
+            return False
+        moov_idx = types.index(b"moov")
+        mdat_idx = types.index(b"mdat")
+        if moov_idx < mdat_idx:
+            shutil.copyfile(src, dest)
+            return False
+        moov_start, moov_end = starts[moov_idx], boxes[moov_idx][2]
+        insert_at = starts[mdat_idx]
+        moov_size = moov_end - moov_start
+        fsrc.seek(moov_start)
+        moov = bytearray(fsrc.read(moov_size))
+
+        def shift(offset: int) -> int:
+            # data between the insertion point and moov moves back by moov_size
+            if insert_at <= offset < moov_start:
+                return offset + moov_size
+            return offset
+
+        header = 16 if struct.unpack_from(">L", moov)[0] == 1 else 8
+        try:
+            patched = patch_chunk_offsets(moov, header, moov_size, shift)
+        except struct.error as exc:
+            raise ValueError(f"truncated box in moov: {exc}") from exc
+        if not patched:
+            print(f"{src}: chunk offsets too large for stco; copying unchanged")
+            shutil.copyfile(src, dest)
+            return False
+        tmp_dest = f"{dest}.tmp"
+        try:
+            with open(tmp_dest, "wb") as fdst:
+                copy_range(fsrc, fdst, 0, insert_at)
+                fdst.write(moov)
+                copy_range(fsrc, fdst, insert_at, moov_start)
+                copy_range(fsrc, fdst, moov_end, file_end)
+            os.replace(tmp_dest, dest)
+        finally:
+            if os.path.exists(tmp_dest):
+                os.remove(tmp_dest)
+    return True
@@ -1,22 +1,45 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import datetime
+import filecmp
 import glob
+import json
 import os
 import re
 import subprocess
-from typing import Optional, List
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-from exif import Image
 import piexif
 from PIL import Image as PILImage
 
-from dateutil import parser as date_parser
-
-
-def mp4_path(input_path: str):
+from util.dates import parse_exif_datetime, parse_filename_datetime
+from util.metadata import read_metadata
+from util.mp4 import mp4_creation_time, read_mp4_info
+from util.s3 import (
+    JOURNAL_FILENAME,
+    Upload,
+    list_objects,
+    load_manifest,
+    refresh_manifest,
+    s3_client,
+    upload_files,
+    write_manifest,
+)
+
+# source, target
+Rename = Tuple[str, str]
+# input, output
+Transcode = Tuple[str, str]
+# H.264; copied to mp4 without re-encoding if not resizing
+WEB_VIDEO_CODECS = {"avc1", "avc3"}
+# under the destination of a batch rename; one [source, target] per line
+RENAME_JOURNAL_FILENAME = ".rename_journal.jsonl"
+
+
+def dated_mp4_path(input_path: str, creation_dt: Optional[datetime]) -> str:
+    """Return the mp4 path for input_path, named with creation_dt if set."""
     filename = input_path.split("/")[-1]
     output_path = input_path.replace(filename.split(".")[-1], "mp4").lower()
-    # try to get creation time from metadata
-    creation_dt = get_mp4_datetime(input_path)
     if not creation_dt:
         return output_path
     # IMG_3417.MOV -> 2021-07-07_3417.mp4
@@ -28,50 +51,205 @@ def mp4_path(input_path: str):
     return output_path
 
 
-def to_mp4(input_path: str, size: Optional[str] = None) -> str:
+def mp4_path(input_path: str):
+    # try to get creation time from metadata
+    return dated_mp4_path(input_path, get_mp4_datetime(input_path))
+
+
+def to_mp4(
+    input_path: str,
+    size: Optional[str] = None,
+    output_path: Optional[str] = None,
+    threads: Optional[int] = None,
+    info: Optional[Dict[str, Any]] = None,
+) -> str:
     """Use ffmpeg to convert a .mov to .mp4.
 
     -i input file
     -an drop audio track
-    -vcodec h264 use H.264 encoding
+    -c:v copy copy H.264 video without re-encoding, if not resizing
     -s target image size
     -y overwrite destination file
     -map_metadata 0 map preserve metadata
     -movflags use_metadata_tags -map_metadata 0
+
+    If copying the video fails, re-encode it.
+
+    :param output_path: write here; default is mp4_path(input_path)
+    :param threads: if provided, limit ffmpeg to this many threads
+    :param info: read_mp4_info(input_path), if already read
     """
-    output_path = mp4_path(input_path)
+    output_path = output_path or mp4_path(input_path)
     size_params = ["-s", size] if size else []
-    command = (
-        [
-            "ffmpeg",
-            "-i",
-            input_path,
-            "-movflags",
-            "use_metadata_tags",
-            "-map_metadata",
-            "0",
-            "-an",
-        ]
-        + size_params
-        + [output_path, "-y", "-loglevel", "error"]
-    )
-    print(" ".join(command))
-    process = subprocess.run(
-        command,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        universal_newlines=True,
-    )
-    print(process.stdout)
+    thread_params = ["-threads", str(threads)] if threads else []
+    if not size and info is None:
+        info = read_mp4_info(input_path)
+    copy = not size and (info or {}).get("video_codec") in WEB_VIDEO_CODECS
+    while True:
+        command = (
+            [
+                "ffmpeg",
+                "-i",
+                input_path,
+                "-movflags",
+                "use_metadata_tags",
+                "-map_metadata",
+                "0",
+                "-an",
+            ]
+            + (["-c:v", "copy"] if copy else size_params + thread_params)
+            + [output_path, "-y", "-loglevel", "error"]
+        )
+        print(" ".join(command))
+        process = subprocess.run(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+        )
+        if process.stdout:
+            print(process.stdout)
+        if not process.returncode:
+            return output_path
+        if not copy:
+            raise ValueError(
+                f"ffmpeg exited with {process.returncode} for {input_path}"
+            )
+        print(f"error copying video from {input_path}; re-encoding")
+        copy = False
+
+
+def transcode_workers(jobs: Optional[int] = None) -> Tuple[int, int]:
+    """Return the number of concurrent ffmpeg jobs and -threads for each.
+
+    By default run a job for every 2 cores; each job gets an equal share.
+    """
+    cpus = os.cpu_count() or 1
+    jobs = jobs or max(1, cpus // 2)
+    return jobs, max(1, cpus // jobs)
+
+
+def transcode(
+    input_path: str,
+    output_path: str,
+    size: Optional[str],
+    threads: int,
+    info: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Transcode to a temporary file, then move it to output_path.
+
+    A partial output from an interrupted run is never left at output_path.
+    """
+    directory, filename = os.path.split(output_path)
+    tmp_path = os.path.join(directory, f".{filename}")
+    try:
+        to_mp4(input_path, size, tmp_path, threads, info)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
     return output_path
 
 
-def process_live_photos(root: str, dest: str, size: Optional[str] = None):
+def transcode_all(
+    transcodes: List[Transcode],
+    size: Optional[str] = None,
+    jobs: Optional[int] = None,
+    remove_input: bool = False,
+    infos: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> List[str]:
+    """Convert videos to mp4 with concurrent ffmpeg jobs.
+
+    Skip videos whose output is newer than the input.
+
+    :param transcodes: input and output path for each video
+    :param size: if provided, resize with -s size (ie 768x576)
+    :param jobs: number of concurrent ffmpeg jobs; see transcode_workers
+    :param remove_input: if true, remove each input after it's converted
+    :param infos: input path -> read_mp4_info, for inputs already read
+    :return: inputs that failed to convert
+    """
+    if infos is None:
+        infos = {}
+    pending: List[Transcode] = []
+    for input_path, output_path in transcodes:
+        if os.path.exists(output_path) and os.path.getmtime(
+            output_path
+        ) >= os.path.getmtime(input_path):
+            print(f"skip: {output_path} is newer than {input_path}")
+            if remove_input and input_path != output_path:
+                os.remove(input_path)
+            continue
+        pending.append((input_path, output_path))
+    if not pending:
+        return []
+    jobs, threads = transcode_workers(jobs)
+    print(f"converting {len(pending)} videos; {jobs} jobs with {threads} threads")
+    failed: List[str] = []
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(
+                transcode,
+                input_path,
+                output_path,
+                size,
+                threads,
+                infos.get(input_path),
+            ): (input_path, output_path)
+            for input_path, output_path in pending
+        }
+        for idx, future in enumerate(as_completed(futures)):
+            input_path, output_path = futures[future]
+            try:
+                future.result()
+                print(f"{idx+1}/{len(pending)} {input_path} -> {output_path}")
+                if remove_input and input_path != output_path:
+                    os.remove(input_path)
+            except Exception as exc:
+                print(f"{idx+1}/{len(pending)} error converting {input_path}: {exc}")
+                failed.append(input_path)
+    return failed
+
+
+def ingest_videos(
+    filenames: List[str], size: Optional[str] = None, jobs: Optional[int] = None
+) -> List[str]:
+    """Convert videos to mp4s named with their creation time.
+
+    The metadata of each video is read once; a .mov is transcoded straight to
+    the dated filename and removed, and an .mp4 is renamed.
+
+    :param size: if provided, resize with -s size (ie 768x576)
+    :param jobs: number of concurrent ffmpeg jobs
+    :return: mp4 filenames
+    """
+    transcodes: List[Transcode] = []
+    infos: Dict[str, Dict[str, Any]] = {}
+    output_paths: List[str] = []
+    for input_path in filenames:
+        info = read_mp4_info(input_path)
+        output_path = dated_mp4_path(input_path, mp4_creation_time(info))
+        if input_path.lower().endswith(".mp4"):
+            if output_path != input_path:
+                print(f"rename {input_path} to {output_path}")
+                os.rename(input_path, output_path)
+            output_paths.append(output_path)
+        else:
+            transcodes.append((input_path, output_path))
+            infos[input_path] = info
+    failed = set(transcode_all(transcodes, size, jobs, remove_input=True, infos=infos))
+    return output_paths + [out for src, out in transcodes if src not in failed]
+
+
+def process_live_photos(
+    root: str, dest: str, size: Optional[str] = None, jobs: Optional[int] = None
+):
     """Find MOV files under root, and use ffmpeg to resize, drop audio, and rename.
 
     :param root: look for .MOV files under this directory
     :param dest: write output to this directory
     :param size: if provided, resize with -s size (ie 768x576)
+    :param jobs: number of concurrent ffmpeg jobs
 
     Download Live Photos with https://github.com/icloud-photos-downloader/icloud_photos_downloader
     icloudpd --directory ~/Pictures/icloud-live-photos --username username -a Live  --until-found 3
@@ -86,8 +264,8 @@ def process_live_photos(root: str, dest: str, size: Optional[str] = None):
     print(f"processing Live Photos from {root} to {dest}")
     files = sorted(glob.glob(f"{root}/**/*.MOV", recursive=True))
     today_str = datetime.now().strftime("%Y-%m-%d")
+    transcodes: List[Transcode] = []
     for idx, file_path in enumerate(files):
-        print(f"{idx+1}/{len(files)} {file_path}")
         # 2021/07/04/IMG_3417.MOV -> 2021-07-04
         if match := re.search(r"(\d+)/(\d+)/(\d+)", file_path):
             dt_str = "-".join(match.groups())
@@ -97,11 +275,9 @@ def process_live_photos(root: str, dest: str, size: Optional[str] = None):
         fn = file_path.split("/")[-1]  # IMG_3417.MOV
         match = re.search(r"_(\d+)\.", fn)
         index = match.group(1) if match else str(idx)
-        mp4_out_fn = to_mp4(file_path, size)
         # dest/2021-07-07_3417.mp4
-        out_fn = f"{dest}/{dt_str}_{index}.mp4"
-        os.rename(mp4_out_fn, out_fn)
-        print(f"wrote {out_fn}")
+        transcodes.append((file_path, f"{dest}/{dt_str}_{index}.mp4"))
+    transcode_all(transcodes, size, jobs)
 
 
 def filename_datetime(filename: str) -> datetime:
@@ -110,41 +286,198 @@ def filename_datetime(filename: str) -> datetime:
     :param filename: filename
     :return: datetime if filename matches a known format
     """
-    # Amazon photos filename format is 2020-07-04_21-00-11.jpg
-    match = re.search(r"(\d\d\d\d-\d\d-\d\d_\d\d-\d\d-\d\d)", filename)
-    if match:
-        return datetime.strptime(match.group(1), "%Y-%m-%d_%H-%M-%S")
-    # IMG_20140629_103425.jpg
-    match = re.search(r"(\d\d\d\d\d\d\d\d_\d\d\d\d\d\d)", filename)
-    if match:
-        return date_parser.parse(match.group(1))
-    raise ValueError(f"no date from {filename}")
+    dt = parse_filename_datetime(filename)
+    if not dt:
+        raise ValueError(f"no date from {filename}")
+    return dt
+
+
+def metadata_exif_datetime(metadata: dict) -> Optional[datetime]:
+    """Return the datetime from read_metadata output, or None if it's missing or invalid.
+
+    EXIF DateTime is used if set; otherwise DateTimeOriginal.
+    """
+    value = metadata.get("datetime") or metadata.get("datetime_original")
+    return parse_exif_datetime(value) if value else None
 
 
 def exif_datetime(fn: str) -> datetime:
     """Try to get datetime from Exif metadata. If that doesn't work, try filename.
 
     :param fn: filename
-    :param keys: list of Exif keys to look for
     :return: datetime form Exif or filename.
     """
-    with open(fn, "rb") as image_file:
-        img = Image(image_file)
-        try:
-            # fix weird date format: 2021:08:06 16:07:56
-            keys = img.list_all()
-            d = t = None
-            for key in ["datetime", "datetime_original"]:
-                if key in keys:
-                    d, t = img[key].split(" ")
+    try:
+        dt = metadata_exif_datetime(read_metadata(fn))
+        if not dt:
+            raise ValueError("no valid exif date")
+        return dt
+    except Exception as exc:
+        print(f"{fn}\terror parsing: {exc}")
+    return filename_datetime(fn)
+
+
+def dated_name(orig: str, dt: datetime) -> str:
+    """Return the filename for orig with a datetime prefix; keep numbers at the end.
+
+    Change .jpeg to .jpg
+    Examples:
+        IMG_123.jpg -> 2020-03-01_120000_123.jpg
+        2021-07-09_12-57-27_471.jpeg -> 2021-07-09_125727_471.jpg
+        dscn0519.jpg -> 2020-03-01_120000_0519.jpg
+    """
+    # get the trailing digits of the filename
+    match = re.search(r"(\d+)\.", os.path.basename(orig))
+    suffix = f"_{match.group(1)}" if match else ""
+    ext = orig.split(".")[-1].lower().replace("jpeg", "jpg")
+    return f"{dt.strftime('%Y-%m-%d_%H%M%S')}{suffix}.{ext}"
+
+
+def target_dir(orig: str, dest: Optional[str], year: str, year_prefix: bool) -> str:
+    if not dest:
+        return os.path.dirname(orig) or "."
+    return f"{dest}/{year}" if year_prefix else dest
+
+
+def resolve_renames(
+    renames: List[Rename], overwrite: bool = False
+) -> Tuple[List[Rename], List[Rename]]:
+    """Make targets unique; find sources identical to their target.
+
+    Each target directory is listed once. A target that exists or is taken by
+    an earlier source (in target, source order) gets a -1, -2, ... suffix, unless
+    the files are identical; then the source is a duplicate and is left in place.
+    With overwrite, existing files are replaced instead of suffixed.
+
+    :return: renames with unique targets, and (source, identical target) duplicates
+    """
+    listings: Dict[str, Set[str]] = {}
+    # target -> source that will be renamed to it
+    claimed: Dict[str, str] = {}
+    resolved: List[Rename] = []
+    duplicates: List[Rename] = []
+    for src, target in sorted(renames, key=lambda r: (r[1], r[0])):
+        if os.path.abspath(src) == os.path.abspath(target):
+            continue
+        directory, name = os.path.split(target)
+        if directory not in listings:
+            listings[directory] = (
+                set(os.listdir(directory)) if os.path.isdir(directory) else set()
+            )
+        base, ext = os.path.splitext(name)
+        candidate = target
+        idx = 0
+        while True:
+            other = claimed.get(candidate)
+            if other is None and os.path.basename(candidate) in listings[directory]:
+                if overwrite:
                     break
-            if not d:
-                raise ValueError("no exif date")
-            return date_parser.parse(f"{d.replace(':', '-')} {t}")
+                other = candidate
+            if other is None:
+                break
+            # other is the file that will be at candidate: a source being
+            # renamed to it, or the existing file
+            if filecmp.cmp(src, other, shallow=False):
+                duplicates.append((src, candidate))
+                candidate = ""
+                break
+            idx += 1
+            candidate = os.path.join(directory, f"{base}-{idx}{ext}")
+        if candidate:
+            claimed[candidate] = src
+            resolved.append((src, candidate))
+    return resolved, duplicates
+
+
+def plan_renames(
+    filenames: List[str],
+    dest: Optional[str] = None,
+    year_prefix: bool = True,
+    overwrite: bool = False,
+    threads: int = 8,
+) -> Tuple[List[Rename], List[Rename]]:
+    """Plan renaming JPG files with a datetime prefix, from dates read in parallel.
+
+    :param filenames: files to rename
+    :param dest: destination path prefix; if not set, rename in place
+    :param year_prefix: if true, add the year as a path segment
+    :param overwrite: if true, replace existing files
+    :param threads: number of threads for reading dates
+    :return: renames, and duplicates of existing files; see resolve_renames
+    """
+
+    def read_datetime(fn: str) -> Optional[datetime]:
+        try:
+            return exif_datetime(fn)
         except Exception as exc:
-            print(f"{fn}\terror parsing: {exc}")
-            pass
-    return filename_datetime(fn)
+            print(f"error renaming {fn}: {exc}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        dts = list(executor.map(read_datetime, filenames))
+    renames: List[Rename] = []
+    for orig, dt in zip(filenames, dts):
+        if not dt:
+            continue
+        fn = dated_name(orig, dt)
+        renames.append((orig, f"{target_dir(orig, dest, fn[:4], year_prefix)}/{fn}"))
+    return resolve_renames(renames, overwrite)
+
+
+def execute_renames(
+    renames: List[Rename],
+    journal_filename: Optional[str] = None,
+    dry_run: bool = False,
+) -> List[str]:
+    """Rename files, recording each rename in a journal before making it.
+
+    The journal is removed when all renames are done; if the batch is
+    interrupted, rollback_renames(journal_filename) puts files back.
+
+    :return: new filenames
+    """
+    if dry_run or not renames:
+        for src, target in renames:
+            print("rename", src, target)
+        return [target for _, target in renames]
+    if journal_filename and os.path.exists(journal_filename):
+        raise ValueError(
+            f"{journal_filename} is from an interrupted rename; "
+            "undo it with rollback_renames or remove it"
+        )
+    for directory in sorted(set(os.path.dirname(target) for _, target in renames)):
+        if directory and not os.path.exists(directory):
+            print(f"creating {directory}")
+            os.makedirs(directory)
+    journal = open(journal_filename, "a") if journal_filename else None
+    try:
+        for src, target in renames:
+            print("rename", src, target)
+            if journal:
+                journal.write(json.dumps([src, target]) + "\n")
+                journal.flush()
+            os.rename(src, target)
+    finally:
+        if journal:
+            journal.close()
+    if journal_filename:
+        os.remove(journal_filename)
+    return [target for _, target in renames]
+
+
+def rename_journal_filename(src: str, dest: Optional[str]) -> str:
+    return f"{dest or src.rstrip('/') or '.'}/{RENAME_JOURNAL_FILENAME}"
+
+
+def rollback_renames(journal_filename: str):
+    """Undo the renames recorded in journal_filename, last first."""
+    with open(journal_filename, "r") as f:
+        renames = [json.loads(line) for line in f if line.strip()]
+    for src, target in reversed(renames):
+        if os.path.exists(target) and not os.path.exists(src):
+            print("rename", target, src)
+            os.rename(target, src)
+    os.remove(journal_filename)
 
 
 def rename_exif(
@@ -154,14 +487,11 @@ def rename_exif(
     overwrite: bool = False,
     dry_run: bool = False,
 ) -> str:
-    """Rename JPG files with a datetime prefix; keep numbers at the end.
+    """Rename a JPG file with a datetime prefix; keep numbers at the end.
 
-    Change .jpeg to .jpg
-    Examples:
-        IMG_123.jpg -> 2020-03-01_1200_123.jpg
-        2021-07-09_12-57-27_471.jpeg -> 2021-07-09_125727_471.jpg
-        dscn0519.jpg -> 2020-03-01_1200_0519.jpg
-        IMG_20130828_071618(1).jpg -> 20130828_071618.jpg
+    See dated_name for examples. If the target exists and is identical, orig is
+    left in place; if it's different, a -1, -2, ... suffix is added. Raises
+    ValueError if orig has no date in EXIF or its name.
 
     :param orig: filename
     :param dest: destination path prefix
@@ -173,38 +503,16 @@ def rename_exif(
     dt = exif_datetime(orig)
     if not dt:
         raise ValueError(f"cannot extract datetime from {orig}")
-    # get the trailing digits of the filename
-    match = re.search(r"(\d+)\.", orig)
-    suffix = f"_{match.group(1)}" if match else ""
-    ext = orig.split(".")[-1].lower().replace("jpeg", "jpg")
-    fn = f"{dt.strftime('%Y-%m-%d_%H%M%S')}{suffix}.{ext}"
-    if fn == orig:
-        return fn
-    prefix = ""
-    if dest:
-        if year_prefix:
-            prefix = f"{dest}/{fn[:4]}/"
-            if not os.path.exists(dest):
-                print(f"creating {dest}")
-                if not dry_run:
-                    os.mkdir(dest)
-            if not os.path.exists(prefix):
-                print(f"creating {prefix}")
-                if not dry_run:
-                    os.mkdir(prefix)
-        else:
-            prefix = f"{dest}/"
-    final_filename = f"{prefix}{fn}"
-    print("rename", orig, final_filename)
-    # if final_filename exists, skip
-    if os.path.exists(final_filename) and not overwrite:
-        print(f"skip: {final_filename} exists")
-        if not dry_run:
-            os.remove(orig)
-        return final_filename
-    if not dry_run:
-        os.rename(orig, final_filename)
-    return final_filename
+    fn = dated_name(orig, dt)
+    target = f"{target_dir(orig, dest, fn[:4], year_prefix)}/{fn}"
+    renames, duplicates = resolve_renames([(orig, target)], overwrite)
+    for src, existing in duplicates:
+        print(f"skip: {src} is the same as {existing}")
+        return existing
+    if not renames:
+        # already named for its date
+        return orig
+    return execute_renames(renames, dry_run=dry_run)[0]
 
 
 def rename_jpg(
@@ -213,27 +521,30 @@ def rename_jpg(
     year_prefix: bool = True,
     overwrite: bool = False,
     dry_run: bool = False,
+    threads: int = 8,
 ) -> List[str]:
-    """Rename all jpg/jpeg files in the current directory with a datetime prefix.
+    """Rename all jpg/jpeg files in src with a datetime prefix.
+
+    Plan all renames first, then make them with a journal in dest (or src) so
+    an interrupted batch can be rolled back with rollback_renames.
 
     :param src: source path prefix
     :param dest: destination path prefix
     :param year_prefix: if true, add the year as a path segment
     :param overwrite: if true, overwrite existing files
     :param dry_run: if true, do not actually rename files
+    :param threads: number of threads for reading dates
     :return: list of new filenames
     """
     if src and not src.endswith("/"):
         src += "/"
-    filenames: List[str] = []
-    for idx, fn in enumerate(
+    filenames = (
         glob.glob(f"{src}*.JPG") + glob.glob(f"{src}*.jpg") + glob.glob(f"{src}*.jpeg")
-    ):
-        try:
-            filenames.append(rename_exif(fn, dest, year_prefix, overwrite, dry_run))
-        except Exception as exc:
-            print(f"error renaming {fn}: {exc}")
-    return filenames
+    )
+    renames, duplicates = plan_renames(filenames, dest, year_prefix, overwrite, threads)
+    for orig, existing in duplicates:
+        print(f"skip: {orig} is the same as {existing}")
+    return execute_renames(renames, rename_journal_filename(src, dest), dry_run)
 
 
 def rename_mp4(
@@ -243,7 +554,7 @@ def rename_mp4(
     overwrite: bool = False,
     dry_run: bool = False,
 ) -> List[str]:
-    """Rename all mp4 files in the current directory with a datetime prefix.
+    """Move all mp4 files in src to dest, keeping their names.
 
     :param src: source path prefix
     :param dest: destination path prefix
@@ -254,84 +565,126 @@ def rename_mp4(
     """
     if src and not src.endswith("/"):
         src += "/"
-    filenames: List[str] = []
-    for idx, full_path in enumerate(glob.glob(f"{src}*.mp4")):
-        fn = full_path.split("/")[-1]
-        prefix = f"{dest}/"
-        if year_prefix:
-            prefix = f"{dest}/{fn[:4]}/"
-        final_filename = f"{prefix}{fn}"
-        if os.path.exists(final_filename) and not overwrite:
-            print(f"skip: {final_filename} exists")
-            if not dry_run:
-                os.remove(fn)
-            continue
-        if dry_run:
-            print("rename", full_path, final_filename)
-        else:
-            os.rename(full_path, final_filename)
-        filenames.append(final_filename)
-    return filenames
+    renames: List[Rename] = []
+    for full_path in glob.glob(f"{src}*.mp4"):
+        fn = os.path.basename(full_path)
+        target = target_dir(full_path, dest, fn[:4], year_prefix)
+        renames.append((full_path, f"{target}/{fn}"))
+    renames, duplicates = resolve_renames(renames, overwrite)
+    for orig, existing in duplicates:
+        print(f"skip: {orig} is the same as {existing}")
+    return execute_renames(renames, rename_journal_filename(src, dest), dry_run)
 
 
 def get_mp4_datetime(file_path: str) -> Optional[datetime]:
-    """Extract datetime metadata from an MP4 file using ffmpeg."""
-    command = ["ffmpeg", "-i", file_path, "-dump", "-"]
-    process = subprocess.run(
-        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
-    )
+    """Get the creation time of an MP4 or MOV file, as naive UTC."""
+    return mp4_creation_time(read_mp4_info(file_path))
+
+
+def scan_files(root: str, extensions: Set[str]) -> Iterator[os.DirEntry]:
+    """Yield files under root with one of extensions (lowercase, without the dot).
 
-    lines = process.stderr.splitlines() + process.stdout.splitlines()
-    lines = [line for line in lines if "creation_time" in line]
-    if not lines:
+    Directories starting with . are skipped.
+    """
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan_files(entry.path, extensions)
+            elif entry.name.rsplit(".", 1)[-1].lower() in extensions:
+                yield entry
+
+
+def metadata_datetime(fn: str) -> Optional[datetime]:
+    """Return the EXIF datetime of fn, or None if it's missing or unreadable."""
+    try:
+        metadata = read_metadata(fn)
+    except Exception as exc:
+        print(f"{fn}\terror reading metadata: {exc}")
         return None
-    # creation_time   : 2024-12-24T16:43:17.000000Z
-    if match := re.search(r"(\d\d\d\d-\d\d-\d\dT\d\d:\d\d:\d\d)", lines[0]):
-        return datetime.fromisoformat(match.group(1))
-    return None
+    return metadata_exif_datetime(metadata)
+
+
+def dated_files(
+    root: str, extensions: Set[str], threads: int = 8
+) -> Iterator[Tuple[str, int, Optional[datetime]]]:
+    """Yield path, size, and datetime for files under root.
+
+    The datetime comes from the filename if it has one; otherwise EXIF is read in a
+    pool of threads, with at most 4 * threads reads in flight.
+    """
+    pending: Deque[Tuple[str, int, Future]] = deque()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for entry in scan_files(root, extensions):
+            size = entry.stat().st_size
+            if dt := parse_filename_datetime(entry.name):
+                yield entry.path, size, dt
+                continue
+            pending.append(
+                (entry.path, size, executor.submit(metadata_datetime, entry.path))
+            )
+            if len(pending) >= 4 * threads:
+                path, size, future = pending.popleft()
+                yield path, size, future.result()
+        while pending:
+            path, size, future = pending.popleft()
+            yield path, size, future.result()
 
 
 def remove_old(
-    since: datetime, skip_before: Optional[datetime] = None, dry_run: bool = False
-):
-    """Remove jpg/jpeg files older than a datetime.
+    since: datetime,
+    skip_before: Optional[datetime] = None,
+    dry_run: bool = False,
+    root: str = ".",
+    threads: int = 8,
+    files: Optional[Iterable[Tuple[str, int, Optional[datetime]]]] = None,
+) -> Dict[str, int]:
+    """Remove jpg/jpeg files under root older than a datetime.
 
     :param since: remove files older than this date
     :param skip_before: skip files older than this date (probably bad/missing metadata)
-    :param dry_run: if true, do not actually remove files
+    :param dry_run: if true, do not actually remove files; report what would be
+    :param root: look for files under this directory
+    :param threads: number of threads for reading EXIF
+    :param files: path, size, and datetime of each file, like dated_files; if set,
+        these are used instead of scanning root
+    :return: counts of files scanned, removed, skipped as too old, and without a
+        date; and bytes removed
     """
-    remove = 0
-    for idx, fn in enumerate(glob.glob("**/*.jpg") + glob.glob("**/*.jpeg")):
-        dt = None
-        try:
-            # try this first since it's simpler/faster
-            dt = filename_datetime(fn)
-        except ValueError:
-            pass
-        try:
-            dt = exif_datetime(fn)
-        except Exception:
-            # print(f"{fn}\tskip: can't get date")
+    counts = {"scanned": 0, "remove": 0, "bytes": 0, "too_old": 0, "no_date": 0}
+    since_str = since.strftime("%Y-%m-%d")
+    if files is None:
+        files = dated_files(root, {"jpg", "jpeg"}, threads)
+    for fn, size, dt in files:
+        counts["scanned"] += 1
+        if not dt:
+            counts["no_date"] += 1
+            print(f"{fn}\tskip: can't get date")
             continue
-        dt_str = dt.strftime("%Y-%m-%d")
         if dt > since:
-            # print(f"{fn}\tskip too new: {dt} > {since}")
             continue
+        dt_str = dt.strftime("%Y-%m-%d")
         if skip_before and dt < skip_before:
+            counts["too_old"] += 1
             print(f"{fn}\tskip too old: {dt_str} < {skip_before.strftime('%Y-%m-%d')}")
             continue
-        print(f"{fn}\tremove; {dt_str} <= {since.strftime('%Y-%m-%d')}")
-        remove += 1
+        print(f"{fn}\tremove; {dt_str} <= {since_str}")
+        counts["remove"] += 1
+        counts["bytes"] += size
         if not dry_run:
             os.remove(fn)
-    print(f"remove {remove}")
+    print(
+        f"{'would remove' if dry_run else 'removed'} {counts['remove']} of "
+        f"{counts['scanned']} files, {counts['bytes'] / 2**20:.1f} MB; skipped "
+        f"{counts['too_old']} too old, {counts['no_date']} without a date"
+    )
+    return counts
 
 
 def extract_caption(fn: str) -> str:
-    with open(fn, "rb") as image_file:
-        img = Image(image_file)
     try:
-        return img.image_description.strip()
+        return read_metadata(fn).get("description", "").strip()
     except Exception as exc:
         print(f"error reading caption from {fn}: {exc}")
         return ""
@@ -390,34 +743,74 @@ def filenames_to_html(filenames: List[str]):
         meta[fn] = extract_caption(fn)
 
 
-def sync_to_s3(path: str, s3_bucket: str, filenames: List[str], dry_run: bool = False):
-    os.chdir(path)
+def sync_to_s3(
+    path: str,
+    s3_bucket: str,
+    filenames: List[str],
+    dry_run: bool = False,
+    threads: int = 10,
+):
+    """Upload filenames under path to s3_bucket, with keys relative to path.
+
+    Record size, mtime, and content hash (S3 ETag) of each file in
+    path/.s3_manifest.json, and compare to a listing of the bucket. Skip files
+    already in the bucket, and report files whose content is already in the
+    bucket or in this batch under a different name instead of uploading them.
+
+    Files are uploaded with the STANDARD_IA storage class in a pool of threads
+    sharing one client; large files are uploaded in parts, and failed uploads
+    are retried. Progress is recorded in path/.s3_journal.json so an interrupted
+    sync resumes.
+    """
     print(f"\nsync files in {path} to s3://{s3_bucket}")
     if not filenames:
         return
-    for idx, fn in enumerate(filenames):
-        print(f"{idx+1}/{len(filenames)}")
-        # convert to relative path
-        fn = fn.replace(f"{path}/", "")
-        command = [
-            "aws",
-            "s3",
-            "cp",
-            fn,
-            f"s3://{s3_bucket}/{fn}",
-            "--no-progress",
-            "--storage-class",
-            "STANDARD_IA",
-        ]
-        print(" ".join(command))
-        if not dry_run:
-            process = subprocess.run(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True,
-            )
-            print(process.stdout)
+    # convert to relative path
+    keys = [fn.replace(f"{path}/", "") for fn in filenames]
+    manifest = load_manifest(path)
+    refresh_manifest(path, manifest, keys)
+    client = s3_client(threads)
+    remote: Dict[str, dict] = {}
+    for prefix in sorted(set(key.split("/")[0] + "/" for key in keys if "/" in key)):
+        remote.update(list_objects(client, s3_bucket, prefix))
+    # content hash -> key already in the bucket or queued for upload
+    keys_by_etag = {obj["etag"]: key for key, obj in remote.items()}
+    keys_by_etag.update(
+        {entry["etag"]: key for key, entry in manifest.items() if entry["uploaded"]}
+    )
+    uploads: List[Upload] = []
+    duplicates = 0
+    for key in keys:
+        entry = manifest[key]
+        if remote.get(key, {}).get("etag") == entry["etag"]:
+            print(f"skip {key}: in bucket")
+            entry["uploaded"] = True
+            continue
+        if keys_by_etag.get(entry["etag"], key) != key:
+            print(f"skip {key}: same content as {keys_by_etag[entry['etag']]}")
+            duplicates += 1
+            continue
+        keys_by_etag[entry["etag"]] = key
+        uploads.append((f"{path}/{key}", key, {"StorageClass": "STANDARD_IA"}))
+        print(f"{path}/{key} -> s3://{s3_bucket}/{key}")
+    print(
+        f"uploading {len(uploads)} files; {duplicates} duplicates; "
+        f"{len(keys) - len(uploads) - duplicates} in bucket"
+    )
+    if not dry_run:
+        failed = upload_files(
+            client,
+            s3_bucket,
+            uploads,
+            threads,
+            journal_filename=f"{path}/{JOURNAL_FILENAME}",
+        )
+        if failed:
+            print(f"{len(failed)} files failed to upload:\n" + "\n".join(failed))
+        for _, key, _ in uploads:
+            if f"{path}/{key}" not in failed:
+                manifest[key]["uploaded"] = True
+    write_manifest(path, manifest)
 
 
 def gps_float_to_dms(
@@ -451,11 +844,14 @@ def write_gps_exif(dest: str, lat: float, lng: float):
 
 def print_gps_exif(dest: str):
     """Print GPS EXIF data from destination image."""
-    dest_img = Image(dest)
-    fields = set(dest_img.list_all())
-    gps_fields = [f for f in fields if f.lower().startswith("gps")]
-    for field in gps_fields:
-        print(f"{field}\t{getattr(dest_img, field)}")
+    metadata = read_metadata(dest)
+    gps_fields = [
+        f
+        for f in metadata
+        if f.startswith("gps") or f in ("latitude", "longitude", "altitude")
+    ]
+    for field in sorted(gps_fields):
+        print(f"{field}\t{metadata[field]}")
 
 
 def copy_gps_exif(src: str, dest: str):
@@ -0,0 +1,306 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+
+"""
+Upload files to S3 from a pool of threads sharing one client.
+
+Files are compared to the bucket listing by size and ETag, so only new and
+changed files are uploaded. The ETag of a file uploaded in one part is its MD5;
+for a multipart upload it is the MD5 of the part MD5s, followed by -<parts>.
+local_etag computes the same value with the part size used for uploads.
+
+Large files are uploaded part by part with progress recorded in a journal, so
+an interrupted sync resumes where it stopped.
+"""
+
+# files at least this big are uploaded in parts of MULTIPART_CHUNKSIZE bytes
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+
+# local filename, key, ExtraArgs for upload_file
+Upload = Tuple[str, str, Dict[str, str]]
+
+# under the root of an archive; relative path -> size, mtime, etag, uploaded
+MANIFEST_FILENAME = ".s3_manifest.json"
+# completed keys, and upload id and part etags of multipart uploads in progress
+JOURNAL_FILENAME = ".s3_journal.json"
+JOURNAL_LOCK = threading.Lock()
+
+
+def s3_client(max_workers: int = 10) -> Any:
+    """Return an S3 client with a connection for each upload thread."""
+    return boto3.client("s3", config=Config(max_pool_connections=max_workers))
+
+
+def list_objects(client: Any, bucket: str, prefix: str = "") -> Dict[str, dict]:
+    """Return size and etag for each key under prefix in bucket."""
+    objects: Dict[str, dict] = {}
+    paginator = client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            objects[obj["Key"]] = {
+                "size": obj["Size"],
+                "etag": obj["ETag"].strip('"'),
+            }
+    return objects
+
+
+def local_etag(filename: str) -> str:
+    """Return the ETag S3 computes for filename when uploaded with upload_file."""
+    size = os.path.getsize(filename)
+    digests: List[bytes] = []
+    md5 = hashlib.md5()
+    with open(filename, "rb") as f:
+        while chunk := f.read(MULTIPART_CHUNKSIZE):
+            if size < MULTIPART_THRESHOLD:
+                md5.update(chunk)
+            else:
+                digests.append(hashlib.md5(chunk).digest())
+    if size < MULTIPART_THRESHOLD:
+        return md5.hexdigest()
+    return f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+
+
+def is_changed(filename: str, remote: Optional[dict]) -> bool:
+    """Return true if filename is not in S3 or differs from the remote object."""
+    if remote is None or remote["size"] != os.path.getsize(filename):
+        return True
+    return remote["etag"] != local_etag(filename)
+
+
+def load_manifest(root: str) -> Dict[str, dict]:
+    filename = f"{root}/{MANIFEST_FILENAME}"
+    if not os.path.exists(filename):
+        return {}
+    with open(filename, "r") as f:
+        return json.load(f)
+
+
+def write_manifest(root: str, manifest: Dict[str, dict]):
+    with open(f"{root}/{MANIFEST_FILENAME}", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def refresh_manifest(root: str, manifest: Dict[str, dict], paths: List[str]):
+    """Add or update manifest entries for paths relative to root.
+
+    The etag is only recomputed for files whose size or mtime changed.
+    """
+    for path in paths:
+        stat = os.stat(f"{root}/{path}")
+        entry = manifest.get(path)
+        if (
+            entry
+            and entry["size"] == stat.st_size
+            and entry["mtime"] == stat.st_mtime_ns
+        ):
+            continue
+        manifest[path] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "etag": local_etag(f"{root}/{path}"),
+            "uploaded": False,
+        }
+
+
+def load_journal(filename: Optional[str]) -> dict:
+    if filename and os.path.exists(filename):
+        with open(filename, "r") as f:
+            return json.load(f)
+    return {"completed": {}, "uploads": {}}
+
+
+def write_journal(filename: Optional[str], journal: dict):
+    """Write journal to filename; call with JOURNAL_LOCK held."""
+    if not filename:
+        return
+    with open(f"{filename}.tmp", "w") as f:
+        json.dump(journal, f, indent=1)
+    os.replace(f"{filename}.tmp", filename)
+
+
+def file_version(filename: str) -> Dict[str, int]:
+    stat = os.stat(filename)
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+
+def upload_parts(
+    client: Any,
+    bucket: str,
+    filename: str,
+    key: str,
+    extra_args: Dict[str, str],
+    journal: dict,
+    journal_filename: Optional[str],
+):
+    """Upload filename in MULTIPART_CHUNKSIZE parts, recording each part in journal.
+
+    Resume an upload in journal for the same version of the file, skipping the
+    parts already uploaded.
+    """
+    version = file_version(filename)
+    with JOURNAL_LOCK:
+        upload = journal["uploads"].get(key)
+    if upload and upload["version"] != version:
+        print(f"{filename} changed; restarting upload")
+        client.abort_multipart_upload(
+            Bucket=bucket, Key=key, UploadId=upload["upload_id"]
+        )
+        upload = None
+    if not upload:
+        response = client.create_multipart_upload(Bucket=bucket, Key=key, **extra_args)
+        upload = {"upload_id": response["UploadId"], "version": version, "parts": {}}
+        with JOURNAL_LOCK:
+            journal["uploads"][key] = upload
+            write_journal(journal_filename, journal)
+    elif upload["parts"]:
+        print(f"resuming {filename} after part {len(upload['parts'])}")
+    parts = upload["parts"]
+    with open(filename, "rb") as f:
+        for number, offset in enumerate(
+            range(0, version["size"], MULTIPART_CHUNKSIZE), 1
+        ):
+            if str(number) in parts:
+                continue
+            f.seek(offset)
+            response = client.upload_part(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload["upload_id"],
+                PartNumber=number,
+                Body=f.read(MULTIPART_CHUNKSIZE),
+            )
+            with JOURNAL_LOCK:
+                parts[str(number)] = response["ETag"]
+                write_journal(journal_filename, journal)
+    client.complete_multipart_upload(
+        Bucket=bucket,
+        Key=key,
+        UploadId=upload["upload_id"],
+        MultipartUpload={
+            "Parts": [
+                {"ETag": etag, "PartNumber": int(number)}
+                for number, etag in sorted(parts.items(), key=lambda p: int(p[0]))
+            ]
+        },
+    )
+
+
+def upload_file(
+    client: Any,
+    bucket: str,
+    filename: str,
+    key: str,
+    extra_args: Dict[str, str],
+    retries: int = 3,
+    journal: Optional[dict] = None,
+    journal_filename: Optional[str] = None,
+):
+    """Upload filename to bucket/key, in parts if large; retry failures with backoff.
+
+    With a journal, large files are uploaded with upload_parts so an interrupted
+    upload resumes from the last part, and completed keys are recorded.
+    """
+    if journal is None:
+        journal = load_journal(None)
+    for attempt in range(retries + 1):
+        try:
+            if os.path.getsize(filename) >= MULTIPART_THRESHOLD:
+                upload_parts(
+                    client, bucket, filename, key, extra_args, journal, journal_filename
+                )
+            else:
+                client.upload_file(filename, bucket, key, ExtraArgs=extra_args)
+            with JOURNAL_LOCK:
+                journal["uploads"].pop(key, None)
+                journal["completed"][key] = file_version(filename)
+                write_journal(journal_filename, journal)
+            return
+        except Exception as exc:
+            if getattr(exc, "response", {}).get("Error", {}).get("Code") == (
+                "NoSuchUpload"
+            ):
+                # upload expired or was aborted; start over
+                with JOURNAL_LOCK:
+                    journal["uploads"].pop(key, None)
+            if attempt == retries:
+                raise
+            print(f"retrying {filename} after error: {exc}")
+            time.sleep(2**attempt)
+
+
+def upload_files(
+    client: Any,
+    bucket: str,
+    uploads: List[Upload],
+    max_workers: int = 10,
+    retries: int = 3,
+    journal_filename: Optional[str] = None,
+) -> List[str]:
+    """Upload files to bucket in a pool of max_workers threads.
+
+    If journal_filename is set, record completed keys and the parts of large
+    uploads there, so a rerun after an interruption skips completed files and
+    resumes partial uploads. The journal is removed when no uploads are left in
+    progress.
+
+    :return: filenames that failed to upload after retries
+    """
+    journal = load_journal(journal_filename)
+    pending = [
+        upload
+        for upload in uploads
+        if journal["completed"].get(upload[1]) != file_version(upload[0])
+    ]
+    if len(pending) < len(uploads):
+        print(f"skipping {len(uploads) - len(pending)} files completed in last run")
+    failed: List[str] = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                upload_file,
+                client,
+                bucket,
+                filename,
+                key,
+                extra_args,
+                retries,
+                journal,
+                journal_filename,
+            ): (filename, key)
+            for filename, key, extra_args in pending
+        }
+        for idx, future in enumerate(as_completed(futures)):
+            filename, key = futures[future]
+            try:
+                future.result()
+                print(f"{idx+1}/{len(pending)} {filename} -> s3://{bucket}/{key}")
+            except Exception as exc:
+                print(f"{idx+1}/{len(pending)} error uploading {filename}: {exc}")
+                failed.append(filename)
+    if journal_filename and not failed:
+        journal["completed"] = {}
+        if journal["uploads"]:
+            write_journal(journal_filename, journal)
+        elif os.path.exists(journal_filename):
+            os.remove(journal_filename)
+    return failed
+
+
+def delete_objects(client: Any, bucket: str, keys: List[str]):
+    """Delete keys from bucket, 1000 at a time."""
+    for idx in range(0, len(keys), 1000):
+        batch = keys[idx : idx + 1000]
+        for key in batch:
+            print(f"deleting s3://{bucket}/{key}")
+        client.delete_objects(
+            Bucket=bucket, Delete={"Objects": [{"Key": key} for key in batch]}
+        )